@@ -0,0 +1,86 @@
+import gzip
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from jsonl_writer import JsonlWriter, jsonl_to_json
+from snapshot_cache import SnapshotCache
+from scheme_extractor import extract_sections_from_html, has_content
+
+logger = logging.getLogger(__name__)
+
+def _extract_snapshot(path):
+    """
+    Runs in a worker process: decompress one cached page and parse its sections.
+    Returns (details, error); details is None when the page has no sections.
+    """
+    try:
+        with gzip.open(path, 'rb') as f:
+            html = f.read().decode('utf-8')
+        details = extract_sections_from_html(html)
+    except Exception as e:
+        return None, str(e)
+    return (details, None) if has_content(details) else (None, None)
+
+def batch_extract(cache, jsonl_file, json_file=None, workers=None, chunksize=16, window=1024):
+    """
+    Re-extract the newest snapshot of every cached page across a pool of processes.
+
+    Pages are handed out in chunks of `chunksize` and at most `window` of them are in
+    flight at once, so memory stays flat on large caches. Records come back in cache
+    order and are streamed to the JSONL sink as soon as they are parsed; each is the
+    scheme's listing fields plus the same section dict scrape_scheme_details returns.
+    Returns (records written, URLs with no sections, URLs that failed).
+    """
+    workers = workers or os.cpu_count() or 1
+    written = 0
+    empty = []
+    failed = []
+    snapshots = ((url, scheme, cache.object_path(content_hash))
+                 for url, _, content_hash, scheme in cache.iter_latest())
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, \
+            JsonlWriter(jsonl_file, flush_every=500, append=False) as writer:
+        while True:
+            batch = list(islice(snapshots, window))
+            if not batch:
+                break
+            results = executor.map(_extract_snapshot, [path for _, _, path in batch], chunksize=chunksize)
+            for (url, scheme, _), (details, error) in zip(batch, results):
+                if error:
+                    logger.warning("Could not extract the snapshot", extra={"url": url, "error": error})
+                    failed.append(url)
+                elif details is None:
+                    empty.append(url)
+                else:
+                    writer.write({**scheme, **details})
+                    written += 1
+
+    if json_file:
+        jsonl_to_json(jsonl_file, json_file)
+    return written, empty, failed
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Re-extract every cached scheme page on all cores")
+    parser.add_argument("cache_dir", help="snapshot cache written by a crawl with --snapshot-dir")
+    parser.add_argument("--jsonl", default="details_from_cache.jsonl", help="JSONL output (default: details_from_cache.jsonl)")
+    parser.add_argument("--json", help="pretty JSON array built from the JSONL")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--chunksize", type=int, default=16, help="pages per task sent to a worker (default: 16)")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    with SnapshotCache(args.cache_dir) as cache:
+        print(f"📦 Snapshot cache: {cache.counts()}")
+        written, empty, failed = batch_extract(cache, args.jsonl, args.json, args.workers, args.chunksize)
+    elapsed = time.monotonic() - started
+    print(f"💾 Extracted {written} records to '{args.json or args.jsonl}' in {elapsed:.1f}s "
+          f"({written / elapsed if elapsed else 0:.0f} pages/s)")
+    if empty:
+        print(f"⚠️ {len(empty)} cached pages had no sections, e.g. {empty[:3]}")
+    if failed:
+        print(f"❌ {len(failed)} cached pages could not be read")
@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import html
+import json
+import math
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from urllib.parse import urlparse
+
+from browser_pool import browser_rss_bytes
+from crawl_engine import CrawlConfig, CrawlEngine
+from fixture_server import start_fixture_server
+from jsonl_writer import JsonlWriter
+from metrics import metrics
+from rate_limiter import AdaptiveRateLimiter
+from scheme_extractor import NOT_FOUND, SECTIONS
+from structured_logging import configure_logging
+
+try:
+    import psutil
+except ImportError:  # /proc is used instead where it exists
+    psutil = None
+
+LISTING_PATH = '/search/category/agriculture'
+
+def _slug(link):
+    return urlparse(link).path.rstrip('/').rsplit('/', 1)[-1]
+
+def _paragraphs(text):
+    # One text node per section, so the extracted text matches the saved record exactly
+    return f"<p>{html.escape(str(text))}</p>"
+
+def _sources(text):
+    # Stored as "label: url" lines, rendered back into links
+    links = []
+    for line in str(text).split('\n'):
+        label, separator, url = line.partition(': ')
+        if separator:
+            links.append(f'<li><a href="{html.escape(url)}">{html.escape(label)}</a></li>')
+        elif line.strip():
+            links.append(f"<li>{html.escape(line)}</li>")
+    return f"<ul>{''.join(links)}</ul>"
+
+def scheme_page_html(record):
+    sections = []
+    for key, heading in SECTIONS.items():
+        value = record.get(key, NOT_FOUND)
+        if not value or value == NOT_FOUND or str(value).startswith('Error'):
+            continue
+        body = _sources(value) if key == 'sources_and_references' else _paragraphs(value)
+        sections.append(f'<section id="{key}"><h3>{html.escape(heading)}</h3><div>{body}</div></section>')
+    return (
+        f"<!DOCTYPE html><html><head><title>{html.escape(record['title'])}</title></head>"
+        f"<body><main><h1>{html.escape(record['title'])}</h1>{''.join(sections)}</main></body></html>"
+    )
+
+def listing_page_html(records, page_number, total_pages, base_url):
+    cards = []
+    for record in records:
+        cards.append(
+            '<div class="card"><div><h2>'
+            f'<a href="{base_url}/schemes/{html.escape(_slug(record["link"]))}">{html.escape(record["title"])}</a>'
+            f'</h2></div><p>{html.escape(record.get("description") or "")}</p></div>'
+        )
+    pager = ''.join(
+        f'<li class="bg-green-700">{n}</li>' if n == page_number else f'<li class="hover:cursor-pointer">{n}</li>'
+        for n in range(1, total_pages + 1)
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>Agriculture, Rural &amp; Environment schemes</title></head>"
+        f"<body><main>{''.join(cards)}</main><ul>{pager}</ul></body></html>"
+    )
+
+def build_fixture_site(directory, base_url, details_file='details_cleaned.json',
+                       listing_file='cleaned_schemes_data.json', schemes=None, per_page=10):
+    """
+    Write a local copy of the category listing and scheme pages built from the saved
+    crawl data. Returns (number of listing pages, number of scheme pages).
+    """
+    with open(details_file, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+    descriptions = {}
+    if listing_file and os.path.exists(listing_file):
+        with open(listing_file, 'r', encoding='utf-8') as f:
+            descriptions = {_slug(s['link']): s.get('description') for s in json.load(f) if s.get('link')}
+
+    unique = {}
+    for record in records:
+        slug = _slug(record.get('link', ''))
+        if slug and slug not in unique:
+            description = descriptions.get(slug) or record.get('description')
+            unique[slug] = {**record, 'description': description}
+    records = list(unique.values())[:schemes]
+
+    os.makedirs(os.path.join(directory, 'schemes'), exist_ok=True)
+    listing_dir = os.path.join(directory, *LISTING_PATH.strip('/').split('/'))
+    os.makedirs(listing_dir, exist_ok=True)
+
+    for record in records:
+        with open(os.path.join(directory, 'schemes', _slug(record['link']) + '.html'), 'w', encoding='utf-8') as f:
+            f.write(scheme_page_html(record))
+
+    total_pages = max(1, -(-len(records) // per_page))
+    for page_number in range(1, total_pages + 1):
+        page_records = records[(page_number - 1) * per_page:page_number * per_page]
+        name = 'index.html' if page_number == 1 else f"page-{page_number}.html"
+        with open(os.path.join(listing_dir, name), 'w', encoding='utf-8') as f:
+            f.write(listing_page_html(page_records, page_number, total_pages, base_url))
+    return total_pages, len(records)
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile of a list of numbers, or None if it's empty
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def self_rss_bytes():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+class RssSampler:
+    """
+    Track the peak resident memory of this process plus the browser processes
+    """
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.peak = None
+
+    def sample(self):
+        values = [v for v in (self_rss_bytes(), browser_rss_bytes()) if v is not None]
+        if values:
+            self.peak = max(self.peak or 0, sum(values))
+
+    async def run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+class IpcCounter:
+    """
+    Count messages sent to the Playwright driver. Relies on a private Playwright
+    method, so the count is simply missing if that ever changes.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._original = None
+        try:
+            from playwright._impl._connection import Connection
+        except ImportError:
+            return
+        self._connection_class = Connection
+        self._original = getattr(Connection, '_send_message_to_server', None)
+
+    def __enter__(self):
+        if self._original is not None:
+            original = self._original
+
+            def counted(connection, *args, **kwargs):
+                self.count += 1
+                return original(connection, *args, **kwargs)
+
+            self._connection_class._send_message_to_server = counted
+        return self
+
+    def __exit__(self, *exc):
+        if self._original is not None:
+            self._connection_class._send_message_to_server = self._original
+
+    @property
+    def available(self):
+        return self._original is not None
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+async def run_benchmark(args):
+    fixture_dir = args.fixture_dir or tempfile.mkdtemp(prefix='scheme-fixture-')
+    server, base_url = start_fixture_server(fixture_dir, latency=args.latency)
+    listing_pages, scheme_pages = build_fixture_site(fixture_dir, base_url, schemes=args.schemes, per_page=args.per_page)
+    print(f"🧪 Fixture site: {listing_pages} listing pages, {scheme_pages} scheme pages at {base_url} "
+          f"(latency {args.latency * 1000:.0f} ms)")
+
+    output_dir = tempfile.mkdtemp(prefix='scheme-benchmark-')
+    if args.polite:
+        rate_limiter = AdaptiveRateLimiter()
+    else:
+        # Measure the scraper itself, not the politeness budget
+        rate_limiter = AdaptiveRateLimiter(initial_rate=1000, max_rate=1000, burst=args.concurrency)
+    config = CrawlConfig(
+        listing_url=base_url + LISTING_PATH,
+        max_listing_pages=listing_pages,
+        listing_shards=args.shards,
+        concurrency=args.concurrency,
+        fetch_mode=args.fetch_mode,
+        block_resources=args.block_resources,
+        jsonl_file=os.path.join(output_dir, 'details.jsonl'),
+        append=False,
+        rate_limiter=rate_limiter
+    )
+
+    engine = CrawlEngine(config)
+    metrics.reset()
+    sampler = RssSampler()
+    sampling = asyncio.create_task(sampler.run())
+    started = time.monotonic()
+    try:
+        with IpcCounter() as ipc:
+            summary = await engine.run()
+    finally:
+        elapsed = time.monotonic() - started
+        sampling.cancel()
+        sampler.sample()
+        server.shutdown()
+
+    detail_pages = len(engine.page_seconds)
+    total_pages = listing_pages + detail_pages
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "config": {
+            "fetch_mode": args.fetch_mode,
+            "concurrency": args.concurrency,
+            "shards": args.shards,
+            "latency_ms": args.latency * 1000,
+            "block_resources": args.block_resources,
+            "polite": args.polite,
+            "schemes": scheme_pages
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "listing": {
+            "pages": listing_pages,
+            "seconds": round(engine.discovery_seconds or 0, 3),
+            "pages_per_sec": round(listing_pages / engine.discovery_seconds, 2) if engine.discovery_seconds else None
+        },
+        "detail": {
+            "pages": detail_pages,
+            "failed": len(summary['failed']),
+            "pages_per_sec": round(detail_pages / elapsed, 2) if elapsed else None,
+            "p50_latency_ms": round(percentile(engine.page_seconds, 50) * 1000, 1) if detail_pages else None,
+            "p95_latency_ms": round(percentile(engine.page_seconds, 95) * 1000, 1) if detail_pages else None
+        },
+        "pages_per_sec": round(total_pages / elapsed, 2) if elapsed else None,
+        "ipc_round_trips_per_page": round(ipc.count / total_pages, 2) if ipc.available and total_pages else None,
+        "peak_rss_mb": round(sampler.peak / 1024 / 1024, 1) if sampler.peak else None,
+        "slowest_steps": [
+            {"metric": name + labels, "seconds": round(seconds, 3), "count": count}
+            for name, labels, seconds, count in metrics.slowest(5)
+        ]
+    }
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the crawl pipeline against a local fixture copy of the site")
+    parser.add_argument("--schemes", type=int, help="number of scheme pages in the fixture (default: all saved ones)")
+    parser.add_argument("--per-page", type=int, default=10, help="schemes per listing page (default: 10)")
+    parser.add_argument("--latency", type=float, default=0.05, help="artificial delay per request in seconds (default: 0.05)")
+    parser.add_argument("--fetch-mode", choices=("browser", "http"), default="browser")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--block-resources", action="store_true")
+    parser.add_argument("--polite", action="store_true", help="keep the default adaptive rate limit")
+    parser.add_argument("--fixture-dir", help="where to write the fixture site (default: a temp dir)")
+    parser.add_argument("--output", default="benchmark_results.jsonl", help="results are appended here, one run per line")
+    parser.add_argument("--log-level", default="WARNING", choices=("DEBUG", "INFO", "WARNING", "ERROR"))
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    result = asyncio.run(run_benchmark(args))
+    with JsonlWriter(args.output) as writer:
+        writer.write(result)
+    print(json.dumps(result, indent=2))
+    print(f"💾 Result appended to '{args.output}'")
+
+if __name__ == "__main__":
+    main()
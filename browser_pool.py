@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from metrics import metrics
+from page_loading import apply_resource_policy
+
+try:
+    import psutil
+except ImportError:  # falls back to /proc on Linux, RSS checks are skipped elsewhere
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+browser_restarts = metrics.counter("browser_restarts_total", "Browser relaunches after a crash")
+contexts_recycled = metrics.counter("contexts_recycled_total", "Browser contexts replaced, by the reason")
+
+# Times work interrupted by a browser crash is tried again before it counts as failed;
+# a page that reliably kills its tab would otherwise be retried forever
+CRASH_RETRIES = 3
+
+class BrowserCrashed(Exception):
+    """
+    The browser died while a page was leased. The pool has already started a new
+    one, so the work that was in progress should be queued again.
+    """
+
+def browser_rss_bytes():
+    """
+    Resident memory of every process started by this one (the Playwright driver,
+    Chromium and its renderers), or None if it can't be measured here
+    """
+    if psutil is not None:
+        total = 0
+        for child in psutil.Process().children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    if not os.path.isdir('/proc'):
+        return None
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                # The command name may contain spaces, the fields after it don't
+                fields = f.read().rsplit(b')', 1)[1].split()
+            parents.setdefault(int(fields[1]), []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+
+    total = 0
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    stack = list(parents.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(parents.get(pid, []))
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            pass
+    return total
+
+class _Slot:
+    def __init__(self, context, page, generation):
+        self.context = context
+        self.page = page
+        self.generation = generation
+        self.created = time.monotonic()
+        self.navigations = 0
+
+    def watch(self, page):
+        # Count main-frame navigations, including redirects and client-side route changes
+        page.on('framenavigated', lambda frame: self._navigated(frame))
+
+    def _navigated(self, frame):
+        if frame.parent_frame is None:
+            self.navigations += 1
+
+class BrowserPool:
+    """
+    Hands out pages to workers and keeps the browser healthy over long runs.
+
+    Each page lives in its own context. After `max_navigations` navigations, or once
+    the browser's processes use more than `max_rss_mb`, the context is closed and a
+    fresh one takes its place, so renderer memory can't keep growing. If the browser
+    crashes it is relaunched (at most `max_restarts` times) and the lease that was
+    using it raises BrowserCrashed so its work can be queued again.
+    """
+
+    def __init__(self, playwright, headless=True, max_navigations=50, max_rss_mb=1500,
+                 block_resources=False, max_restarts=5, rss_check_interval=10.0):
+        self.playwright = playwright
+        self.headless = headless
+        self.max_navigations = max_navigations
+        self.max_rss_mb = max_rss_mb
+        self.block_resources = block_resources
+        self.max_restarts = max_restarts
+        self.rss_check_interval = rss_check_interval
+        self.browser = None
+        self.generation = 0
+        self.restarts = 0
+        self.recycled = 0
+        self.idle = []
+        self._lock = asyncio.Lock()
+        self._last_rss_check = 0.0
+        self._recycle_before = 0.0
+
+    async def start(self):
+        self.browser = await self.playwright.chromium.launch(headless=self.headless)
+        return self
+
+    async def close(self):
+        for slot in self.idle:
+            await self._close_slot(slot)
+        self.idle = []
+        if self.browser is not None:
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _new_slot(self):
+        context = await self.browser.new_context()
+        if self.block_resources:
+            await apply_resource_policy(context)
+        page = await context.new_page()
+        slot = _Slot(context, page, self.generation)
+        slot.watch(page)
+        return slot
+
+    async def _close_slot(self, slot):
+        try:
+            await slot.context.close()
+        except Exception:
+            pass
+
+    async def restart(self, generation):
+        """
+        Replace a crashed browser. Only the first lease to notice a crash relaunches it.
+        """
+        async with self._lock:
+            if generation != self.generation:
+                return
+            if self.restarts >= self.max_restarts:
+                raise RuntimeError(f"Browser crashed {self.restarts + 1} times, giving up")
+            self.restarts += 1
+            browser_restarts.inc()
+            logger.error("Browser crashed, relaunching it", extra={"restart": self.restarts, "max_restarts": self.max_restarts})
+            self.idle = []
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+            self.browser = await self.playwright.chromium.launch(headless=self.headless)
+            self.generation += 1
+
+    def _over_memory(self):
+        if not self.max_rss_mb:
+            return False
+        now = time.monotonic()
+        if now - self._last_rss_check < self.rss_check_interval:
+            return False
+        self._last_rss_check = now
+        rss = browser_rss_bytes()
+        if rss is None or rss < self.max_rss_mb * 1024 * 1024:
+            return False
+        logger.warning("Browser memory over the limit, recycling every open context", extra={"rss_mb": round(rss / 1024 / 1024)})
+        # Every context open now is replaced as soon as it's released
+        self._recycle_before = now
+        return True
+
+    async def _release(self, slot):
+        if slot.generation != self.generation or not self.browser.is_connected():
+            # The work finished, so it stands; the slot is dropped and the next lease
+            # relaunches the browser if it's gone
+            await self._close_slot(slot)
+            return
+
+        over_memory = self._over_memory()
+        if over_memory or slot.navigations >= self.max_navigations or slot.created <= self._recycle_before:
+            self.recycled += 1
+            contexts_recycled.inc(reason="navigations" if slot.navigations >= self.max_navigations else "memory")
+            await self._close_slot(slot)
+        elif slot.page.is_closed():
+            # The page crashed but its context is fine
+            slot.page = await slot.context.new_page()
+            slot.watch(slot.page)
+            self.idle.append(slot)
+        else:
+            self.idle.append(slot)
+
+    @asynccontextmanager
+    async def page(self):
+        """
+        Lease a page for one unit of work:
+
+            async with pool.page() as page:
+                await page.goto(url)
+
+        If the work raises, the page's context is thrown away rather than reused.
+        BrowserCrashed is only raised while acquiring the page or from failed work,
+        never for work that finished before the crash was noticed.
+        """
+        generation = self.generation
+        try:
+            if not self.browser.is_connected():
+                await self.restart(generation)
+                generation = self.generation
+            slot = self.idle.pop() if self.idle else await self._new_slot()
+        except Exception:
+            await self._check_crash(generation)
+            raise
+
+        try:
+            yield slot.page
+        except Exception:
+            await self._check_crash(slot.generation)
+            await self._close_slot(slot)
+            raise
+        await self._release(slot)
+
+    async def _check_crash(self, generation):
+        if generation != self.generation:
+            # Another lease already found the browser dead and replaced it
+            raise BrowserCrashed("The browser was replaced after a crash")
+        if not self.browser.is_connected():
+            await self.restart(generation)
+            raise BrowserCrashed("The browser closed unexpectedly")
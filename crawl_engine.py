@@ -0,0 +1,832 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+
+from playwright.async_api import async_playwright
+
+import page_loading
+from browser_pool import CRASH_RETRIES, BrowserCrashed, BrowserPool
+from crawl_plan import CrawlPlan, discover_plan
+from crawl_state import CrawlState
+from dedup import canonical_url
+from http_fetch import create_http_client, fetch_scheme_html
+from incremental import FingerprintStore, check_for_change, load_previous_records
+from jsonl_writer import JsonlWriter, jsonl_to_json
+from listing import discover_listing_links
+from metrics import metrics
+from parquet_export import ParquetExporter
+from rate_limiter import AdaptiveRateLimiter
+from record_store import RecordStore
+from retry import BROWSER_CRASH, DeadLetterQueue, scrape_with_retries
+from search_index import SearchIndex
+from snapshot_cache import SnapshotCache
+from scheme_extractor import SECTIONS, extract_sections_from_html, has_content, scrape_scheme_details
+from structured_logging import configure_logging
+from work_queue import SQLiteWorkQueue
+
+# Log progress at INFO every this many stored schemes; each single one is DEBUG
+PROGRESS_EVERY = 25
+
+logger = logging.getLogger(__name__)
+
+write_seconds = metrics.histogram("write_seconds", "Time to write one page to each sink")
+schemes_total = metrics.counter("schemes_total", "Schemes stored, by the outcome")
+
+class CrawlConfig:
+    """
+    Settings for one crawl. The project's scripts are each one of these plus a call to run_crawl().
+
+    Schemes come either from `listing_url` (listing pages crawled in `listing_shards` shards),
+    from a CrawlPlan of several category/state facets in `plan` (collected as parallel
+    shards and merged by canonical link before the detail phase, each scheme tagged with
+    its facets), or from a fixed `schemes` list. `fetch_mode` is 'browser' to render every detail page,
+    or 'http' to fetch the server-rendered HTML and only render pages where that finds no
+    content. `queue_size` bounds every stage queue, so a fast stage waits for a slow one
+    instead of piling up work in memory. Browser pages come from a BrowserPool, which
+    recycles them after `max_navigations` or above `max_rss_mb` of browser memory.
+    Records are streamed to `jsonl_file`: a resumed crawl (a state file with progress) keeps
+    adding to it when `append` is set, a new crawl starts it over. `json_file`, built from
+    it at the end, holds the latest record of each scheme.
+    With `snapshot_dir`, the raw HTML of every page is kept in a SnapshotCache there.
+    With `parquet_dir`, every stored record is also appended to a Parquet dataset there,
+    as this run's batch of part files. With `search_index_file`, every stored record is
+    upserted into a full-text SearchIndex there, and with `record_store_file` into a
+    RecordStore keyed by canonical link.
+
+    With `work_queue` (a WorkQueue such as SQLiteWorkQueue shared by several processes
+    or hosts), discovered schemes are added to that queue instead of the local one, and
+    the crawl leases schemes from it as `worker_id` while discovery is still running.
+    The process that discovers schemes seals the queue once discovery is done. A process
+    given no listing, plan or schemes only works through the queue, polling with a
+    backoff from `poll_interval` up to `max_poll_interval` seconds until the queue is
+    sealed and drained.
+    All workers, listing shards included, share `rate_limiter` (a default AdaptiveRateLimiter if not given).
+    With `metrics_file`, the run's metrics are written there at the end, as a JSON
+    summary for a *.json path and Prometheus text otherwise.
+    `build_record(scheme, details)` shapes the stored
+    record; by default the listing fields and the sections are merged.
+    With `listing_only`, detail pages aren't fetched at all: each discovered scheme's
+    listing fields are stored as its record.
+    """
+
+    def __init__(self, listing_url=None, schemes=None, max_listing_pages=60, listing_shards=4,
+                 concurrency=4, fetch_mode='browser', block_resources=False, headless=True,
+                 max_navigations=50, max_rss_mb=1500, queue_size=None, state_file=None, jsonl_file='details.jsonl', json_file=None,
+                 append=True, failed_file=None, max_attempts=3, dead_letter_file=None,
+                 incremental_baseline=None, fingerprint_file=None, snapshot_dir=None, rate_limiter=None,
+                 build_record=None, metrics_file=None, parquet_dir=None,
+                 search_index_file=None, record_store_file=None, plan=None,
+                 work_queue=None, worker_id=None, poll_interval=2.0, max_poll_interval=30.0, listing_only=False):
+        if listing_url is None and schemes is None and plan is None and work_queue is None:
+            raise ValueError("A crawl needs a listing_url, a plan, a list of schemes or a work queue")
+        if fetch_mode not in ('browser', 'http'):
+            raise ValueError(f"Unknown fetch mode: {fetch_mode}")
+        self.listing_url = listing_url
+        self.plan = plan
+        self.schemes = schemes
+        self.max_listing_pages = max_listing_pages
+        self.listing_shards = listing_shards
+        self.concurrency = max(1, concurrency)
+        self.fetch_mode = fetch_mode
+        self.block_resources = block_resources
+        self.headless = headless
+        self.max_navigations = max_navigations
+        self.max_rss_mb = max_rss_mb
+        self.queue_size = queue_size or self.concurrency * 4
+        # Without a state file the crawl can't be resumed, but still runs the same way
+        self.state_file = state_file or ':memory:'
+        self.jsonl_file = jsonl_file
+        self.json_file = json_file
+        self.append = append
+        self.failed_file = failed_file
+        self.max_attempts = max_attempts
+        self.dead_letter_file = dead_letter_file
+        self.incremental_baseline = incremental_baseline
+        self.fingerprint_file = fingerprint_file
+        self.snapshot_dir = snapshot_dir
+        self.rate_limiter = rate_limiter
+        self.build_record = build_record or (lambda scheme, details: {**scheme, **details})
+        self.metrics_file = metrics_file
+        self.parquet_dir = parquet_dir
+        self.search_index_file = search_index_file
+        self.record_store_file = record_store_file
+        self.work_queue = work_queue
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max(poll_interval, max_poll_interval)
+        self.listing_only = listing_only
+
+def load_schemes(path):
+    """
+    Load a JSON list of schemes, making every link absolute and dropping schemes without one
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        schemes_data = json.load(f)
+
+    schemes = []
+    for scheme in schemes_data:
+        link = scheme.get('link', '')
+        if not link or link == "No link found":
+            logger.warning("No valid link found, skipping", extra={"scheme": scheme.get('title', 'Unknown')})
+            continue
+        schemes.append({**scheme, 'link': canonical_url(link)})
+    return schemes
+
+class CrawlEngine:
+    """
+    Discovery, fetch, extraction and storage running as concurrent stages:
+
+        discovery -> link queue -> fetch workers -> extract queue -> extract workers -> store queue -> store
+
+    Discovery streams links as each listing page is scraped, so detail pages start
+    loading while the listing is still being collected. In 'http' mode, pages whose
+    HTML has no content go from the extract stage to a few browser render workers.
+    Each queue is bounded, so memory stays flat however far discovery runs ahead.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.link_queue = asyncio.Queue(config.queue_size)
+        self.extract_queue = asyncio.Queue(config.queue_size)
+        self.store_queue = asyncio.Queue(config.queue_size)
+        # Fed only from the extract stage, which is itself bounded; never blocks it
+        self.render_queue = asyncio.Queue()
+        self.seen_links = set()
+        self.discovered = 0
+        self.done = 0
+        self.carried_forward = 0
+        self.failed = 0
+        # Seconds spent fetching and extracting each stored page, and on the listing
+        self.page_seconds = []
+        self.discovery_seconds = None
+        # Leases held on the shared work queue, by link, and a wake-up for the
+        # queue consumer when this process enqueues more
+        self.leases = {}
+        self.work_added = asyncio.Event()
+        # Leased schemes this process failed; they needn't be in its own crawl state
+        self.failed_leases = {}
+        # Records written to the JSONL file but not yet flushed, so not yet marked done
+        self.unsynced = []
+
+    # --- discovery --- #
+
+    async def emit(self, schemes):
+        """
+        Queue schemes for the fetch stage, skipping duplicates (by canonical URL) and
+        schemes already done. Blocks while the fetch stage is behind.
+        With a shared work queue, the schemes go there instead.
+        """
+        if self.config.work_queue is not None:
+            if self.config.work_queue.enqueue(schemes):
+                self.work_added.set()
+            return
+        for scheme in schemes:
+            link = canonical_url(scheme['link'])
+            if link in self.seen_links or link in self.done_links:
+                continue
+            if link != scheme['link']:
+                scheme = {**scheme, 'link': link}
+            self.seen_links.add(link)
+            self.discovered += 1
+            await self.link_queue.put(scheme)
+
+    async def discover(self):
+        started = time.monotonic()
+        queue = self.config.work_queue
+        discovers = self.config.listing_url is not None or self.config.plan is not None or self.config.schemes is not None
+        consumer = None
+        if queue is not None:
+            if discovers:
+                # A new discovery pass; workers wait for it to be sealed again
+                queue.unseal()
+            # Detail work starts on the first schemes enqueued, while discovery goes on
+            consumer = asyncio.create_task(self.consume_work())
+
+        try:
+            await self.discover_schemes()
+        except BaseException:
+            if consumer is not None:
+                consumer.cancel()
+            raise
+        self.discovery_seconds = time.monotonic() - started
+        logger.info("Discovery finished", extra={"schemes": self.discovered, "seconds": round(self.discovery_seconds, 1)})
+
+        if consumer is not None:
+            if discovers:
+                queue.seal()
+                logger.info("Shared work queue sealed", extra={"counts": queue.counts()})
+            await consumer
+
+    async def discover_schemes(self):
+        # Schemes that failed for good last time go first
+        if self.dead_letters:
+            retried_schemes = self.dead_letters.schemes()
+            if retried_schemes:
+                logger.info("Retrying dead-lettered schemes first", extra={"schemes": len(retried_schemes)})
+                self.state.add_links(retried_schemes)
+                await self.emit(retried_schemes)
+
+        # Then whatever an interrupted run left behind
+        await self.emit(self.state.pending_schemes())
+
+        if self.config.schemes is not None:
+            self.state.add_links(self.config.schemes)
+            await self.emit(self.config.schemes)
+        elif self.config.listing_url is None and self.config.plan is None:
+            # Only a worker of a shared queue; other processes discover the schemes
+            pass
+        elif self.state.is_listing_complete():
+            logger.info("Link collection already finished in a previous run")
+        elif self.config.plan is not None:
+            # Every facet is collected before any detail page, so a scheme listed under
+            # several facets is queued once with all of them
+            schemes, failed = await discover_plan(
+                self.pool, self.config.plan, shards=self.config.listing_shards, rate_limiter=self.rate_limiter
+            )
+            self.state.add_links(schemes)
+            await self.emit(schemes)
+            if failed:
+                logger.warning("Listing pages failed and will be retried on the next run", extra={"pages": failed})
+            else:
+                self.state.mark_listing_complete()
+        else:
+            await discover_listing_links(
+                self.pool, self.config.listing_url, self.config.max_listing_pages, self.emit,
+                shards=self.config.listing_shards, state=self.state, rate_limiter=self.rate_limiter
+            )
+
+    async def consume_work(self):
+        """
+        Lease schemes from the shared work queue whenever the fetch stage has room,
+        renewing the leases of schemes in flight, until the queue is sealed and drained.
+        While the queue has nothing to lease, polling backs off from poll_interval to
+        max_poll_interval; schemes this process enqueues wake it straight away.
+        """
+        queue = self.config.work_queue
+        worker = self.config.worker_id
+        heartbeat_every = queue.visibility_timeout / 3
+        last_heartbeat = time.monotonic()
+        delay = self.config.poll_interval
+        logger.info("Working through the shared queue", extra={"worker": worker, "counts": queue.counts()})
+        while True:
+            room = self.link_queue.maxsize - self.link_queue.qsize()
+            leases = queue.lease(worker, room) if room > 0 else []
+            for lease in leases:
+                self.leases[lease.key] = lease
+                self.discovered += 1
+                await self.link_queue.put({**lease.item, 'link': lease.key})
+
+            if time.monotonic() - last_heartbeat >= heartbeat_every:
+                for lease in list(self.leases.values()):
+                    if not queue.heartbeat(lease):
+                        # Another worker has it now; finishing it anyway is harmless
+                        logger.warning("Lease lost", extra={"worker": worker, "link": lease.key})
+                last_heartbeat = time.monotonic()
+
+            if leases:
+                delay = self.config.poll_interval
+                continue
+            if room <= 0:
+                # The fetch stage is behind, not the queue
+                await asyncio.sleep(self.config.poll_interval)
+                continue
+            if queue.is_finished():
+                break
+            logger.debug("Shared queue empty, waiting", extra={"worker": worker, "seconds": delay, "sealed": queue.is_sealed()})
+            try:
+                await asyncio.wait_for(self.work_added.wait(), min(delay, heartbeat_every))
+            except asyncio.TimeoutError:
+                delay = min(delay * 2, self.config.max_poll_interval)
+            self.work_added.clear()
+
+    def settle_lease(self, link, record=None, error=None):
+        lease = self.leases.pop(link, None)
+        if lease is None:
+            return
+        if error is None:
+            self.config.work_queue.complete(lease, record)
+        else:
+            self.config.work_queue.fail(lease, error)
+            self.failed_leases[lease.key] = {**lease.item, 'link': lease.key}
+
+    # --- fetch --- #
+
+    async def render(self, item):
+        """
+        Load the scheme on a pooled page and extract its sections in-page, with retries.
+        Raises BrowserCrashed if the browser died meanwhile, so the item can be retried.
+        """
+        scheme = item['scheme']
+        started = time.monotonic()
+        async with self.pool.page() as page:
+            async def scrape():
+                details = await scrape_scheme_details(page, scheme['link'], scheme['title'], self.rate_limiter)
+                if page.is_closed():
+                    # Retrying on a dead page is pointless, let the pool hand out a fresh one
+                    raise BrowserCrashed("The page closed while it was loading")
+                return details
+
+            details, error_kind, attempts = await scrape_with_retries(scrape, scheme['title'], self.config.max_attempts)
+            if self.snapshots is not None and error_kind is None:
+                item['snapshot'] = await page.content()
+                item['fetched_at'] = time.time()
+        item.update(details=details, error_kind=error_kind, attempts=attempts)
+        item['elapsed'] = item.get('elapsed', 0.0) + time.monotonic() - started
+        return item
+
+    async def check_unchanged(self, item):
+        """
+        Incremental mode: carry the previous record forward if the page hasn't changed.
+        That is the record the crawl state last stored for the scheme, which matches the
+        stored fingerprint; the baseline file only serves schemes the state has no record of.
+        In 'http' mode a changed page keeps the HTML and sections the check fetched,
+        so the extract stage uses them instead of fetching the page again.
+        """
+        scheme = item['scheme']
+        link = scheme['link']
+        previous = self.state.last_result(link) or self.previous_records.get(link)
+        if previous is None:
+            return False
+        item['fetched_at'] = time.time()
+        started = time.monotonic()
+        try:
+            changed, fingerprint, details, html = await check_for_change(
+                self.client, link, self.fingerprints.get(link), previous, self.rate_limiter
+            )
+        except Exception as e:
+            logger.warning("Change check failed", extra={"scheme": scheme.get('title', link), "error": str(e)})
+            return False
+        if changed:
+            # Only remembered once the full scrape has succeeded
+            item['fingerprint'] = fingerprint
+            if html is not None and self.config.fetch_mode == 'http':
+                item.update(html=html, details=details, elapsed=time.monotonic() - started)
+            return False
+        self.fingerprints.record(link, *fingerprint)
+        item['record'] = {**scheme, **{key: previous.get(key) for key in SECTIONS}}
+        return True
+
+    def crash_failed(self, item, crashes, error):
+        """
+        Whether a scheme interrupted by a browser crash has been tried often enough;
+        if so it is recorded as failed, and goes to the dead-letter queue
+        """
+        if crashes <= CRASH_RETRIES:
+            return False
+        logger.warning("The scheme keeps crashing the browser, giving up", extra={
+            "scheme": item['scheme']['title'], "crashes": crashes
+        })
+        item.update(error_kind=BROWSER_CRASH, error=error, attempts=crashes)
+        return True
+
+    async def fetch_worker(self, worker_id):
+        crashed = None
+        while True:
+            # Work interrupted by a browser crash is picked up again before anything new
+            if crashed is None:
+                crashes = 0
+            scheme = crashed or await self.link_queue.get()
+            crashed = None
+            if scheme is None:
+                break
+
+            item = {'scheme': scheme}
+            if self.config.listing_only:
+                item.update(details={}, error_kind=None, attempts=0)
+                await self.store_queue.put(item)
+                continue
+            try:
+                if self.previous_records is not None and await self.check_unchanged(item):
+                    await self.store_queue.put(item)
+                    continue
+
+                # Unless the change check already fetched the page
+                if self.config.fetch_mode == 'http' and 'html' not in item:
+                    try:
+                        item['fetched_at'] = time.time()
+                        started = time.monotonic()
+                        item['html'] = await fetch_scheme_html(self.client, scheme['link'], self.rate_limiter)
+                        item['elapsed'] = time.monotonic() - started
+                    except Exception as e:
+                        logger.info("HTTP fetch failed, falling back to the browser", extra={"scheme": scheme['title'], "error": str(e)})
+                        await self.render_queue.put(item)
+                        continue
+                elif self.config.fetch_mode == 'browser':
+                    logger.debug("Processing scheme", extra={"worker": worker_id, "scheme": scheme['title']})
+                    await self.render(item)
+
+                await self.extract_queue.put(item)
+
+            except BrowserCrashed as e:
+                crashes += 1
+                if self.crash_failed(item, crashes, e):
+                    await self.store_queue.put(item)
+                    continue
+                logger.info("Browser restarted, queuing the scheme again", extra={"worker": worker_id, "scheme": scheme['title']})
+                crashed = scheme
+            except Exception as e:
+                logger.error("Unexpected error while processing scheme", extra={"scheme": scheme['title'], "error": str(e)})
+                item.update(error_kind='unknown', error=e, attempts=1)
+                await self.store_queue.put(item)
+
+    async def render_worker(self, worker_id):
+        """
+        Browser fallback for pages the HTTP fetch couldn't use
+        """
+        crashed = None
+        while True:
+            if crashed is None:
+                crashes = 0
+            item = crashed or await self.render_queue.get()
+            crashed = None
+            if item is None:
+                break
+
+            scheme = item['scheme']
+            logger.debug("Rendering scheme", extra={"worker": worker_id, "scheme": scheme['title']})
+            try:
+                await self.render(item)
+            except BrowserCrashed as e:
+                crashes += 1
+                if not self.crash_failed(item, crashes, e):
+                    logger.info("Browser restarted, queuing the scheme again", extra={"worker": worker_id, "scheme": scheme['title']})
+                    crashed = item
+                    continue
+            except Exception as e:
+                logger.error("Unexpected error while rendering scheme", extra={"scheme": scheme['title'], "error": str(e)})
+                item.update(error_kind='unknown', error=e, attempts=1)
+            await self.store_queue.put(item)
+
+    # --- extraction --- #
+
+    async def extract_worker(self):
+        while True:
+            item = await self.extract_queue.get()
+            if item is None:
+                break
+
+            if 'html' in item:
+                scheme = item['scheme']
+                html = item.pop('html')
+                # Sections parsed by an incremental change check are used as they are
+                details = item.pop('details', None)
+                started = time.monotonic()
+                try:
+                    if details is None:
+                        # Parsing is CPU work, keep it off the event loop
+                        details = await asyncio.to_thread(extract_sections_from_html, html)
+                    item['elapsed'] += time.monotonic() - started
+                except Exception as e:
+                    logger.info("Could not parse the HTML, falling back to the browser", extra={"scheme": scheme['title'], "error": str(e)})
+                    await self.render_queue.put(item)
+                    continue
+                if not has_content(details):
+                    logger.debug("No content over HTTP, falling back to the browser", extra={"scheme": scheme['title']})
+                    await self.render_queue.put(item)
+                    continue
+                logger.debug("Extracted details over HTTP", extra={"scheme": scheme['title']})
+                item.update(details=details, error_kind=None, attempts=1)
+                if self.snapshots is not None:
+                    item['snapshot'] = html
+
+            await self.store_queue.put(item)
+
+    # --- storage --- #
+
+    def store(self, item):
+        scheme = item['scheme']
+        link = scheme['link']
+
+        if item.get('error_kind'):
+            error = item.get('error') or item['details'].get('details')
+            logger.warning("Failed to extract details", extra={
+                "scheme": scheme['title'], "kind": item['error_kind'], "attempts": item['attempts']
+            })
+            with write_seconds.time(sink="state"):
+                self.state.record_failure(link, error)
+            if self.dead_letters:
+                self.dead_letters.add(scheme, item['error_kind'], error, item['attempts'])
+            self.settle_lease(link, error=error)
+            self.failed += 1
+            schemes_total.inc(outcome="failed")
+            return
+
+        if 'record' in item:
+            record = item['record']
+            self.carried_forward += 1
+            schemes_total.inc(outcome="carried_forward")
+        else:
+            record = self.config.build_record(scheme, item['details'])
+            schemes_total.inc(outcome="scraped")
+            logger.debug("Extracted details", extra={"scheme": scheme['title']})
+        with write_seconds.time(sink="jsonl"):
+            synced = self.writer.write(record)
+        self.unsynced.append((link, record))
+        if synced:
+            self.commit_written()
+        if self.parquet is not None:
+            with write_seconds.time(sink="parquet"):
+                self.parquet.write(record)
+        if self.records is not None:
+            with write_seconds.time(sink="records"):
+                self.records.upsert(record)
+        if self.search_index is not None:
+            with write_seconds.time(sink="search"):
+                self.search_index.upsert(record)
+        if 'elapsed' in item:
+            self.page_seconds.append(item['elapsed'])
+        if item.get('fingerprint'):
+            self.fingerprints.record(link, *item['fingerprint'])
+        self.settle_lease(link, record)
+        self.done += 1
+
+    def commit_written(self):
+        """
+        Mark the schemes done once their records are on disk in the JSONL file, and only
+        then drop them from the dead-letter queue. Done before that, a crash would leave
+        schemes the resumed run skips but the JSONL lacks.
+        """
+        if self.unsynced:
+            with write_seconds.time(sink="state"):
+                self.state.record_results(self.unsynced)
+            if self.dead_letters:
+                self.dead_letters.remove(link for link, _ in self.unsynced)
+            self.unsynced = []
+
+    async def store_snapshot(self, item):
+        """
+        Keep the page's raw HTML in the snapshot cache so it can be re-extracted offline
+        """
+        html = item.pop('snapshot')
+        scheme = item['scheme']
+        # Compressing and writing the file happens off the event loop, the index stays here
+        with write_seconds.time(sink="snapshot"):
+            content_hash = await asyncio.to_thread(self.snapshots.write_object, html)
+            self.snapshots.record(scheme['link'], content_hash, len(html), item.get('fetched_at'), scheme)
+
+    async def store_worker(self):
+        while True:
+            item = await self.store_queue.get()
+            if item is None:
+                break
+            try:
+                if 'snapshot' in item:
+                    await self.store_snapshot(item)
+                self.store(item)
+            except Exception as e:
+                logger.error("Could not store scheme", extra={
+                    "scheme": item['scheme'].get('title', item['scheme']['link']), "error": str(e)
+                })
+            processed = self.done + self.failed
+            logger.log(logging.INFO if processed % PROGRESS_EVERY == 0 else logging.DEBUG, "Progress", extra={
+                "processed": processed, "discovered": self.discovered,
+                "links_queue": self.link_queue.qsize(), "extract_queue": self.extract_queue.qsize(),
+                "render_queue": self.render_queue.qsize(), "store_queue": self.store_queue.qsize()
+            })
+
+    # --- running --- #
+
+    async def run_pipeline(self):
+        concurrency = self.config.concurrency
+        render_workers = max(1, concurrency // 2) if self.config.fetch_mode == 'http' else 0
+        logger.info("Crawling", extra={
+            "fetch_workers": concurrency, "fetch_mode": self.config.fetch_mode,
+            "render_workers": render_workers, "queue_size": self.config.queue_size
+        })
+
+        discovery = asyncio.create_task(self.discover())
+        fetchers = asyncio.gather(*(self.fetch_worker(n + 1) for n in range(concurrency)), return_exceptions=True)
+        extractors = asyncio.gather(*(self.extract_worker() for _ in range(concurrency)), return_exceptions=True)
+        renderers = asyncio.gather(*(self.render_worker(n + 1) for n in range(render_workers)), return_exceptions=True)
+        storer = asyncio.create_task(self.store_worker())
+
+        try:
+            # If every fetch worker dies, discovery would block on the full queue forever
+            await asyncio.wait({discovery, fetchers}, return_when=asyncio.FIRST_COMPLETED)
+            if not discovery.done():
+                logger.error("Every fetch worker stopped, abandoning discovery")
+                discovery.cancel()
+            outcome, = await asyncio.gather(discovery, return_exceptions=True)
+            if isinstance(outcome, BaseException):
+                logger.error("Discovery stopped early", extra={"error": repr(outcome)})
+
+            # Shut the stages down in order, each after the one feeding it has drained
+            for _ in range(concurrency):
+                await self.link_queue.put(None)
+            for n, outcome in enumerate(await fetchers):
+                if isinstance(outcome, Exception):
+                    logger.error("Fetch worker stopped early", extra={"worker": n + 1, "error": repr(outcome)})
+            for _ in range(concurrency):
+                await self.extract_queue.put(None)
+            await extractors
+            for _ in range(render_workers):
+                await self.render_queue.put(None)
+            for n, outcome in enumerate(await renderers):
+                if isinstance(outcome, Exception):
+                    logger.error("Render worker stopped early", extra={"worker": n + 1, "error": repr(outcome)})
+            await self.store_queue.put(None)
+            await storer
+        finally:
+            for task in (discovery, fetchers, extractors, renderers, storer):
+                task.cancel()
+
+    async def run(self):
+        config = self.config
+        self.state = CrawlState(config.state_file)
+        # An incremental run after a finished crawl is a new round over every scheme
+        refreshing = bool(config.incremental_baseline) and self.state.begin_refresh()
+        if refreshing:
+            logger.info("Previous crawl finished, checking every scheme again")
+        # A new crawl starts the JSONL file over; only a resumed one keeps adding to it
+        resuming = bool(self.state.counts()) and not refreshing
+        self.done_links = self.state.done_links()
+        logger.info("Crawl state", extra={"path": config.state_file, "counts": self.state.counts() or "new crawl"})
+        self.rate_limiter = config.rate_limiter or AdaptiveRateLimiter()
+        self.dead_letters = DeadLetterQueue(config.dead_letter_file) if config.dead_letter_file else None
+        self.previous_records = None
+        self.fingerprints = None
+        if config.incremental_baseline:
+            self.previous_records = load_previous_records(config.incremental_baseline)
+            self.fingerprints = FingerprintStore(config.fingerprint_file or ':memory:')
+        needs_client = config.fetch_mode == 'http' or self.previous_records is not None
+        self.client = create_http_client(config.concurrency) if needs_client else None
+        self.writer = JsonlWriter(config.jsonl_file, append=config.append and resuming)
+        self.snapshots = SnapshotCache(config.snapshot_dir) if config.snapshot_dir else None
+        self.parquet = ParquetExporter(config.parquet_dir) if config.parquet_dir else None
+        self.search_index = SearchIndex(config.search_index_file) if config.search_index_file else None
+        self.records = RecordStore(config.record_store_file) if config.record_store_file else None
+
+        try:
+            async with async_playwright() as p:
+                self.pool = BrowserPool(
+                    p, headless=config.headless, max_navigations=config.max_navigations,
+                    max_rss_mb=config.max_rss_mb, block_resources=config.block_resources
+                )
+                async with self.pool:
+                    await self.run_pipeline()
+        finally:
+            self.writer.close()
+            self.commit_written()
+            if self.parquet is not None:
+                self.parquet.close()
+                logger.info("Parquet export", extra={"path": config.parquet_dir, "records": self.parquet.count})
+            if self.records is not None:
+                self.records.close()
+            if self.search_index is not None:
+                self.search_index.optimize()
+                self.search_index.close()
+            if self.client is not None:
+                await self.client.aclose()
+            if self.fingerprints is not None:
+                self.fingerprints.close()
+            if self.snapshots is not None:
+                logger.info("Snapshot cache", extra=self.snapshots.counts())
+                self.snapshots.close()
+            # Last, so a queue that can't be written doesn't keep the outputs above from
+            # closing: schemes this process won't finish go back to the other workers
+            for lease in self.leases.values():
+                try:
+                    config.work_queue.release(lease)
+                except Exception as e:
+                    logger.error("Could not release the lease", extra={"link": lease.key, "error": str(e)})
+            if config.work_queue is not None:
+                logger.info("Shared work queue", extra={"worker": config.worker_id, "counts": config.work_queue.counts()})
+
+        if config.work_queue is not None:
+            # Leased schemes are only in this process's state if it discovered them
+            failed_schemes = list(self.failed_leases.values())
+        else:
+            failed_schemes = self.state.failed_schemes()
+        # The JSON output lists the schemes in the order they were discovered
+        discovery_order = self.state.links() if config.json_file else None
+        self.state.close()
+        if self.dead_letters:
+            if failed_schemes:
+                logger.info("Dead-letter queue for the next run", extra={"counts": self.dead_letters.counts()})
+            self.dead_letters.close()
+
+        logger.info("Browser pool", extra={"recycled": self.pool.recycled, "restarts": self.pool.restarts})
+        if page_loading.wait_stats["waits"]:
+            logger.info("Event-driven waits", extra={
+                "saved_seconds": round(page_loading.wait_stats['saved_seconds'], 1), "waits": page_loading.wait_stats['waits']
+            })
+        for name, labels, seconds, count in metrics.slowest(5):
+            logger.info("Time spent", extra={"metric": name + labels, "seconds": round(seconds, 2), "count": count})
+        if config.metrics_file:
+            metrics.write(config.metrics_file)
+            logger.info("Metrics written", extra={"path": config.metrics_file})
+
+        summary = {
+            "discovered": self.discovered,
+            "done": self.done,
+            "carried_forward": self.carried_forward,
+            "failed": failed_schemes,
+            "total": None
+        }
+
+        # --- FINAL: Save all collected data --- #
+        try:
+            if config.json_file:
+                summary["total"] = jsonl_to_json(config.jsonl_file, config.json_file, discovery_order)
+            logger.info("Scraping completed", extra={
+                "scraped": self.done - self.carried_forward, "carried_forward": self.carried_forward,
+                "failed": len(failed_schemes), "total": summary["total"], "output": config.json_file or config.jsonl_file
+            })
+
+            if failed_schemes and config.failed_file:
+                with open(config.failed_file, 'w', encoding='utf-8') as f:
+                    json.dump(failed_schemes, f, indent=2, ensure_ascii=False)
+                logger.info("Failed schemes saved", extra={"path": config.failed_file})
+        except Exception as e:
+            logger.error("Error saving data", extra={"error": str(e)})
+
+        return summary
+
+async def run_crawl(config):
+    """
+    Run one crawl and return a summary: counts of discovered, done and carried-forward
+    schemes, the failed schemes, and the number of records in the JSON output
+    """
+    return await CrawlEngine(config).run()
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl myScheme listing and detail pages through a pipelined engine")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--listing-url", help="search/category page whose listing pages are crawled for schemes")
+    source.add_argument("--schemes-file", help="JSON list of schemes (title, link) to scrape instead of a listing")
+    source.add_argument("--facet", action="append", help="category/state/ministry facet to crawl, e.g. state:Haryana; repeatable")
+    source.add_argument("--plan-file", help="JSON list of facets to crawl (crawl_plan.py)")
+    parser.add_argument("--max-pages", type=int, default=60, help="listing pages to crawl, per facet (default: 60)")
+    parser.add_argument("--shards", type=int, default=4, help="parallel workers for the listing pages (default: 4)")
+    parser.add_argument("--listing-only", action="store_true", help="only collect the listing, storing each scheme's listing fields")
+    parser.add_argument("--concurrency", type=int, default=4, help="detail fetch workers (default: 4)")
+    parser.add_argument("--fetch-mode", choices=("browser", "http"), default="browser")
+    parser.add_argument("--queue-size", type=int, help="bound of every stage queue (default: 4 x concurrency)")
+    parser.add_argument("--block-resources", action="store_true", help="block images, fonts, media and trackers")
+    parser.add_argument("--headed", action="store_true", help="show the browser window instead of running headless")
+    parser.add_argument("--max-navigations", type=int, default=50, help="navigations before a browser context is recycled (default: 50)")
+    parser.add_argument("--max-rss-mb", type=int, default=1500, help="browser memory that triggers recycling every context (default: 1500)")
+    parser.add_argument("--state", help="SQLite crawl state, for resuming (default: none)")
+    parser.add_argument("--jsonl", default="details.jsonl", help="JSONL output (default: details.jsonl)")
+    parser.add_argument("--json", help="pretty JSON array built from the JSONL at the end")
+    parser.add_argument("--failed", help="where to write the schemes that failed")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--dead-letters", help="SQLite dead-letter queue shared between runs")
+    parser.add_argument("--incremental-baseline", help="previous crawl's JSON output; unchanged schemes are carried forward")
+    parser.add_argument("--fingerprints", help="SQLite fingerprint store for incremental runs")
+    parser.add_argument("--snapshot-dir", help="keep every page's HTML here for offline re-extraction (snapshot_cache.py)")
+    parser.add_argument("--parquet-dir", help="also append every record to a zstd Parquet dataset here (parquet_export.py)")
+    parser.add_argument("--search-index", help="keep a full-text index of the records in this SQLite file (search_index.py)")
+    parser.add_argument("--record-store", help="upsert every record into this SQLite store (record_store.py)")
+    parser.add_argument("--work-queue", help="SQLite work queue shared by several crawler processes (work_queue.py); "
+                                             "without a source, this process only works through it")
+    parser.add_argument("--worker-id", help="name of this worker in the work queue (default: host:pid)")
+    parser.add_argument("--visibility-timeout", type=float, default=300.0,
+                        help="seconds before an unrenewed lease goes to another worker (default: 300)")
+    parser.add_argument("--metrics-out", help="write stage timings here: a JSON summary for *.json, Prometheus text otherwise")
+    parser.add_argument("--log-level", default="INFO", choices=("DEBUG", "INFO", "WARNING", "ERROR"))
+    parser.add_argument("--log-json", action="store_true", help="log one JSON object per line")
+    args = parser.parse_args()
+    if not (args.listing_url or args.schemes_file or args.facet or args.plan_file or args.work_queue):
+        parser.error("one of --listing-url, --schemes-file, --facet, --plan-file or --work-queue is required")
+    configure_logging(args.log_level, json_output=args.log_json)
+
+    config = CrawlConfig(
+        listing_url=args.listing_url,
+        plan=(CrawlPlan.from_strings(args.facet, args.max_pages) if args.facet
+              else CrawlPlan.load(args.plan_file, args.max_pages) if args.plan_file else None),
+        schemes=load_schemes(args.schemes_file) if args.schemes_file else None,
+        max_listing_pages=args.max_pages,
+        listing_shards=args.shards,
+        concurrency=args.concurrency,
+        fetch_mode=args.fetch_mode,
+        block_resources=args.block_resources,
+        headless=not args.headed,
+        max_navigations=args.max_navigations,
+        max_rss_mb=args.max_rss_mb,
+        queue_size=args.queue_size,
+        state_file=args.state,
+        jsonl_file=args.jsonl,
+        json_file=args.json,
+        failed_file=args.failed,
+        max_attempts=args.max_attempts,
+        dead_letter_file=args.dead_letters,
+        incremental_baseline=args.incremental_baseline,
+        fingerprint_file=args.fingerprints,
+        snapshot_dir=args.snapshot_dir,
+        metrics_file=args.metrics_out,
+        parquet_dir=args.parquet_dir,
+        search_index_file=args.search_index,
+        record_store_file=args.record_store,
+        work_queue=SQLiteWorkQueue(args.work_queue, args.visibility_timeout, args.max_attempts) if args.work_queue else None,
+        worker_id=args.worker_id,
+        listing_only=args.listing_only
+    )
+    asyncio.run(run_crawl(config))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import logging
+from urllib.parse import quote
+
+from dedup import canonical_url
+from listing import discover_listing_links
+from scheme_extractor import BASE_URL
+
+# Listing pages of the portal, by facet kind
+FACET_KINDS = ('category', 'state', 'ministry')
+
+logger = logging.getLogger(__name__)
+
+class Facet:
+    """
+    One slice of the portal's listing, e.g. category "Agriculture,Rural & Environment"
+    or state "Haryana", crawled as one shard of a plan
+    """
+
+    def __init__(self, kind, value, max_pages=60):
+        if kind not in FACET_KINDS:
+            raise ValueError(f"Unknown facet kind: {kind} (expected one of {', '.join(FACET_KINDS)})")
+        self.kind = kind
+        self.value = value
+        self.max_pages = max_pages
+
+    @property
+    def label(self):
+        return f"{self.kind}:{self.value}"
+
+    @property
+    def url(self):
+        return f"{BASE_URL}/search/{self.kind}/{quote(self.value, safe=',&')}"
+
+    def __repr__(self):
+        return f"Facet({self.label!r}, max_pages={self.max_pages})"
+
+def parse_facet(text, max_pages=60):
+    """
+    Build a Facet from "kind:value", e.g. "state:Haryana"
+    """
+    kind, separator, value = text.partition(':')
+    if not separator or not value.strip():
+        raise ValueError(f"Facets are written kind:value, got {text!r}")
+    return Facet(kind.strip().lower(), value.strip(), max_pages)
+
+class CrawlPlan:
+    """
+    The facets one crawl covers. Every facet's listing is collected as its own shard,
+    several at a time, and links found under more than one facet are merged before
+    the detail phase, so each scheme is fetched once and tagged with all its facets.
+    """
+
+    def __init__(self, facets):
+        if not facets:
+            raise ValueError("A crawl plan needs at least one facet")
+        self.facets = list(facets)
+
+    @classmethod
+    def from_strings(cls, texts, max_pages=60):
+        return cls([parse_facet(text, max_pages) for text in texts])
+
+    @classmethod
+    def load(cls, path, max_pages=60):
+        """
+        Load a plan from a JSON list of "kind:value" strings or
+        {"kind": ..., "value": ..., "max_pages": ...} objects
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        facets = []
+        for entry in entries:
+            if isinstance(entry, str):
+                facets.append(parse_facet(entry, max_pages))
+            else:
+                facets.append(Facet(entry['kind'], entry['value'], entry.get('max_pages', max_pages)))
+        return cls(facets)
+
+    def __len__(self):
+        return len(self.facets)
+
+async def discover_plan(pool, plan, shards=4, rate_limiter=None):
+    """
+    Collect the listing of every facet of the plan on a shared browser pool, with
+    about `shards` listing pages open at once in total. Returns (schemes, failed)
+    where schemes are deduplicated by canonical link, in discovery order, each with
+    a 'facets' list of every facet it was listed under, and failed maps facet
+    labels to their listing pages that failed. Every facet's listing pages take from
+    the same `rate_limiter` budget.
+    """
+    found = {}
+    failed = {}
+    parallel_facets = max(1, min(shards, len(plan)))
+    shards_per_facet = max(1, shards // parallel_facets)
+    semaphore = asyncio.Semaphore(parallel_facets)
+
+    async def collect(facet):
+        async def emit(schemes):
+            for scheme in schemes:
+                link = canonical_url(scheme['link'])
+                entry = found.setdefault(link, {**scheme, 'link': link, 'facets': []})
+                if facet.label not in entry['facets']:
+                    entry['facets'].append(facet.label)
+
+        async with semaphore:
+            logger.info("Collecting facet", extra={"facet": facet.label, "url": facet.url})
+            failed_pages = await discover_listing_links(
+                pool, facet.url, facet.max_pages, emit, shards=shards_per_facet, rate_limiter=rate_limiter
+            )
+            if failed_pages:
+                failed[facet.label] = failed_pages
+
+    await asyncio.gather(*(collect(facet) for facet in plan.facets))
+    shared = sum(1 for scheme in found.values() if len(scheme['facets']) > 1)
+    logger.info("Plan collected", extra={"facets": len(plan), "schemes": len(found), "listed_under_several": shared})
+    return list(found.values()), failed
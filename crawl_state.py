@@ -0,0 +1,183 @@
+import json
+import sqlite3
+import time
+
+from dedup import canonical_url
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS listing_pages (
+    page_number INTEGER PRIMARY KEY,
+    schemes TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS links (
+    link TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    scheme TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS links_status ON links (status, position);
+"""
+
+class CrawlState:
+    """
+    Durable record of crawl progress. Every listing page and every scheme result is
+    committed as soon as it finishes, so a restarted crawl picks up where it stopped.
+
+    Link status is one of 'pending', 'done' or 'failed'.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- listing phase --- #
+
+    def is_listing_complete(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'listing_complete'").fetchone()
+        return bool(row and row[0] == '1')
+
+    def mark_listing_complete(self):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('listing_complete', '1')")
+
+    def begin_refresh(self):
+        """
+        Start a new round of a finished crawl (no link pending): every done link is
+        pending again and the listing is collected afresh, so an incremental run
+        re-checks every scheme and finds new ones. A round that was interrupted is
+        resumed instead. Returns True if a new round started.
+        """
+        counts = self.counts()
+        if not counts.get('done') or counts.get('pending'):
+            return False
+        with self.conn:
+            self.conn.execute("UPDATE links SET status = 'pending', updated_at = ? WHERE status = 'done'", (time.time(),))
+            self.conn.execute("DELETE FROM listing_pages")
+            self.conn.execute("DELETE FROM meta WHERE key = 'listing_complete'")
+        return True
+
+    def listing_page(self, page_number):
+        """
+        Return the schemes recorded for a listing page, or None if it hasn't been scraped yet
+        """
+        row = self.conn.execute(
+            "SELECT schemes FROM listing_pages WHERE page_number = ?", (page_number,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def record_listing_page(self, page_number, schemes):
+        """
+        Store a scraped listing page and queue its links for the detail phase
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO listing_pages (page_number, schemes, updated_at) VALUES (?, ?, ?)",
+                (page_number, json.dumps(schemes, ensure_ascii=False), now)
+            )
+            self._queue_links(schemes, now)
+
+    def add_links(self, schemes):
+        """
+        Queue schemes for the detail phase without a listing page (e.g. loaded from a file)
+        """
+        with self.conn:
+            self._queue_links(schemes, time.time())
+
+    def _queue_links(self, schemes, now):
+        # Links keep the position they were first discovered at; duplicates, however the
+        # link is spelled, are ignored
+        next_position = self.conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM links").fetchone()[0]
+        for scheme in schemes:
+            scheme = {**scheme, 'link': canonical_url(scheme['link'])}
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO links (link, position, scheme, updated_at) VALUES (?, ?, ?, ?)",
+                (scheme['link'], next_position, json.dumps(scheme, ensure_ascii=False), now)
+            )
+            next_position += cursor.rowcount
+
+    def links(self):
+        """
+        Every link, in discovery order
+        """
+        return [row[0] for row in self.conn.execute("SELECT link FROM links ORDER BY position")]
+
+    def all_schemes(self):
+        rows = self.conn.execute("SELECT scheme FROM links ORDER BY position")
+        return [json.loads(row[0]) for row in rows]
+
+    # --- detail phase --- #
+
+    def pending_schemes(self):
+        """
+        Schemes whose details are not done yet (never tried or failed), in discovery order
+        """
+        rows = self.conn.execute("SELECT scheme FROM links WHERE status != 'done' ORDER BY position")
+        return [json.loads(row[0]) for row in rows]
+
+    def record_result(self, link, detailed_scheme):
+        self.record_results([(link, detailed_scheme)])
+
+    def record_results(self, results):
+        """
+        Mark several links done with their records, (link, record) pairs, in one transaction
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE links SET status = 'done', result = ?, error = NULL, attempts = attempts + 1, updated_at = ? WHERE link = ?",
+                [(json.dumps(record, ensure_ascii=False), now, link) for link, record in results]
+            )
+
+    def record_failure(self, link, error):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE links SET status = 'failed', error = ?, attempts = attempts + 1, updated_at = ? WHERE link = ?",
+                (str(error), time.time(), link)
+            )
+
+    def done_links(self):
+        return {row[0] for row in self.conn.execute("SELECT link FROM links WHERE status = 'done'")}
+
+    def last_result(self, link):
+        """
+        The record last stored for a link, kept across refresh rounds, or None if it never succeeded
+        """
+        row = self.conn.execute("SELECT result FROM links WHERE link = ?", (link,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def done_results(self):
+        rows = self.conn.execute("SELECT result FROM links WHERE status = 'done' ORDER BY position")
+        return [json.loads(row[0]) for row in rows]
+
+    def failed_schemes(self):
+        rows = self.conn.execute("SELECT scheme FROM links WHERE status = 'failed' ORDER BY position")
+        return [json.loads(row[0]) for row in rows]
+
+    def counts(self):
+        """
+        Number of links per status, e.g. {'pending': 10, 'done': 500, 'failed': 3}
+        """
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM links GROUP BY status").fetchall())
@@ -0,0 +1,282 @@
+import hashlib
+import logging
+import random
+import re
+import sqlite3
+import time
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from scheme_extractor import BASE_URL
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that never change which page is served
+TRACKING_PARAMS = {'fbclid', 'gclid', 'msclkid', 'ref', 'source', 'lang'}
+TRACKING_PREFIXES = ('utm_',)
+
+# Word overlap (Jaccard) of two titles from which the schemes are flagged as near-duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.7
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+def canonical_url(link, base=BASE_URL):
+    """
+    The one spelling of a scheme URL used for every comparison: absolute, lower-case
+    host, no default port, fragment or trailing slash, and no tracking or empty query
+    parameters, with the rest sorted. Links on the host of `base` (or its bare
+    domain) are always https on the www host; other hosts keep their own scheme.
+
+        /schemes/pm-kisan/
+        HTTP://MyScheme.gov.in/schemes/pm-kisan?utm_source=x
+            -> https://www.myscheme.gov.in/schemes/pm-kisan
+    """
+    parts = urlsplit(urljoin(base + '/', link.strip()))
+    host = (parts.hostname or '').lower()
+    base_parts = urlsplit(base)
+    base_host = base_parts.hostname
+    scheme = (parts.scheme or 'https').lower()
+    if host in (base_host, base_host[4:] if base_host.startswith('www.') else base_host):
+        host, scheme = base_host, base_parts.scheme
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r'/{2,}', '/', parts.path).rstrip('/') or '/'
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query)
+        if value and key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ))
+    return urlunsplit((scheme, host, path, query, ''))
+
+def title_tokens(title):
+    """
+    Words of a title, lower-cased, for the similarity index
+    """
+    return set(re.findall(r'[a-z0-9]+', (title or '').lower()))
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+class MinHashLSH:
+    """
+    Near-duplicate index over token sets. Each set gets a MinHash signature of
+    `num_perm` values, split into `bands`; two sets become candidates when any band
+    matches exactly, which only takes a dict lookup per band instead of comparing
+    against every title seen so far. Candidates are kept when their estimated
+    Jaccard similarity reaches `threshold`.
+
+    The defaults (16 bands of 8) make sets around 0.7 similar likely to collide.
+    """
+
+    def __init__(self, num_perm=128, bands=16, threshold=NEAR_DUPLICATE_THRESHOLD, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                             for _ in range(num_perm)]
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+
+    def signature(self, tokens):
+        hashes = [int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+                  for token in tokens] or [0]
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self.permutations)
+
+    def similarity(self, sig_a, sig_b):
+        return sum(x == y for x, y in zip(sig_a, sig_b)) / self.num_perm
+
+    def _bands(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def candidates(self, signature):
+        """
+        Keys of indexed sets sharing at least one band with `signature`
+        """
+        keys = set()
+        for band, rows in self._bands(signature):
+            keys.update(self.buckets[band].get(rows, ()))
+        return keys
+
+    def query(self, signature):
+        """
+        Return [(key, estimated similarity)] of indexed sets similar to `signature`, most similar first
+        """
+        matches = [(key, self.similarity(signature, self.signatures[key])) for key in self.candidates(signature)]
+        return sorted([m for m in matches if m[1] >= self.threshold], key=lambda m: m[1], reverse=True)
+
+    def add(self, key, signature):
+        self.signatures[key] = signature
+        for band, rows in self._bands(signature):
+            self.buckets[band].setdefault(rows, []).append(key)
+
+    def __len__(self):
+        return len(self.signatures)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (
+    key TEXT PRIMARY KEY,
+    title TEXT,
+    first_seen REAL NOT NULL
+);
+"""
+
+class SeenSet:
+    """
+    Persistent set of canonical URLs already passed downstream, so a new listing
+    batch only lets through schemes no earlier run has seen. Titles are kept too,
+    to rebuild the near-duplicate index on the next run.
+    Inserts are committed every `commit_every` keys and on close.
+    """
+
+    def __init__(self, path, commit_every=500):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.commit_every = commit_every
+        self._uncommitted = 0
+
+    def __contains__(self, key):
+        return self.conn.execute("SELECT 1 FROM seen WHERE key = ?", (key,)).fetchone() is not None
+
+    def add(self, key, title=None):
+        """
+        Remember a key. Returns False if it had been seen already.
+        """
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO seen (key, title, first_seen) VALUES (?, ?, ?)", (key, title, time.time())
+        )
+        if cursor.rowcount:
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self.commit()
+        return bool(cursor.rowcount)
+
+    def items(self):
+        """
+        Yield (key, title) of everything seen, oldest first
+        """
+        yield from self.conn.execute("SELECT key, title FROM seen ORDER BY first_seen, rowid")
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def commit(self):
+        self.conn.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Deduplicator:
+    """
+    Streaming dedup stage: exact duplicates by canonical URL against `seen`, and
+    near-duplicate titles flagged (not dropped) through a MinHashLSH index that is
+    seeded with the titles `seen` already holds. The index only proposes candidates;
+    their exact word overlap decides, since short titles make the estimate noisy.
+    """
+
+    def __init__(self, seen, index=None):
+        self.seen = seen
+        self.index = index or MinHashLSH()
+        self.titles = {}
+        self.tokens = {}
+        self.duplicates = 0
+        self.near_duplicates = []
+        for key, title in seen.items():
+            self._index(key, title)
+
+    def _index(self, key, title):
+        tokens = title_tokens(title)
+        if tokens:
+            self.titles[key] = title
+            self.tokens[key] = tokens
+            self.index.add(key, self.index.signature(tokens))
+
+    def check(self, record):
+        """
+        Returns the record with its link canonicalised, or None for a duplicate
+        """
+        key = canonical_url(record['link'])
+        title = record.get('title')
+        if not self.seen.add(key, title):
+            self.duplicates += 1
+            return None
+
+        tokens = title_tokens(title)
+        if tokens:
+            signature = self.index.signature(tokens)
+            matches = sorted(
+                ((other, jaccard(tokens, self.tokens[other])) for other in self.index.candidates(signature)),
+                key=lambda match: match[1], reverse=True
+            )
+            matches = [match for match in matches if match[1] >= self.index.threshold]
+            if matches:
+                self.near_duplicates.append({
+                    "title": title,
+                    "link": key,
+                    "similar_to": [{"title": self.titles[other], "link": other, "similarity": round(similarity, 2)}
+                                   for other, similarity in matches]
+                })
+            self.titles[key] = title
+            self.tokens[key] = tokens
+            self.index.add(key, signature)
+        return {**record, 'link': key}
+
+    def dedup(self, records, canonical_links=True):
+        """
+        Yield the records not seen before, one at a time, with their link canonicalised
+        or, with `canonical_links=False`, as they came
+        """
+        for record in records:
+            if not record.get('link') or record['link'] == "No link found":
+                continue
+            unique = self.check(record)
+            if unique is not None:
+                yield unique if canonical_links else record
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from jsonl_writer import JsonlWriter, iter_records, write_json_array
+    from structured_logging import configure_logging
+
+    parser = argparse.ArgumentParser(description="Drop schemes seen before (by canonical URL) and flag near-duplicate titles")
+    parser.add_argument("src", help="schemes to dedup, JSON array or JSONL")
+    parser.add_argument("dst", help="unique schemes; JSONL for *.jsonl, a pretty JSON array otherwise")
+    parser.add_argument("--seen", default=":memory:", help="SQLite seen-set kept between runs (default: this run only)")
+    parser.add_argument("--near-duplicates", default="near_duplicate_titles.json", help="report of similar titles")
+    parser.add_argument("--threshold", type=float, default=NEAR_DUPLICATE_THRESHOLD)
+    args = parser.parse_args()
+    configure_logging()
+
+    started = time.monotonic()
+    with SeenSet(args.seen) as seen:
+        deduplicator = Deduplicator(seen, MinHashLSH(threshold=args.threshold))
+        unique = deduplicator.dedup(iter_records(args.src))
+        if args.dst.endswith('.jsonl'):
+            with JsonlWriter(args.dst, flush_every=500, append=False) as writer:
+                for record in unique:
+                    writer.write(record)
+            written = writer.count
+        else:
+            written = write_json_array(unique, args.dst)
+
+    with open(args.near_duplicates, 'w', encoding='utf-8') as f:
+        json.dump(deduplicator.near_duplicates, f, indent=2, ensure_ascii=False)
+    logger.info("Dedup finished", extra={
+        "kept": written, "duplicates": deduplicator.duplicates, "path": args.dst,
+        "seconds": round(time.monotonic() - started, 1)
+    })
+    logger.info("Near-duplicate titles flagged", extra={"titles": len(deduplicator.near_duplicates), "path": args.near_duplicates})
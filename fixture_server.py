@@ -0,0 +1,65 @@
+import argparse
+import os
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """
+    Serve saved pages from a directory, mapping /schemes/pm-kisan to schemes/pm-kisan.html
+    and listing pages like /search/category/x?page=3 to search/category/x/page-3.html
+    """
+
+    def __init__(self, *args, latency=0.0, **kwargs):
+        self.latency = latency
+        super().__init__(*args, **kwargs)
+
+    def translate_path(self, path):
+        parts = urlparse(path)
+        local_path = super().translate_path(parts.path)
+        page_number = parse_qs(parts.query).get('page', [''])[0]
+        if page_number.isdigit() and os.path.exists(os.path.join(local_path, f"page-{page_number}.html")):
+            return os.path.join(local_path, f"page-{page_number}.html")
+        if not os.path.exists(local_path) and os.path.exists(local_path + ".html"):
+            return local_path + ".html"
+        if os.path.isdir(local_path) and os.path.exists(os.path.join(local_path, "index.html")):
+            return os.path.join(local_path, "index.html")
+        return local_path
+
+    def send_head(self):
+        if self.latency:
+            time.sleep(self.latency)
+        return super().send_head()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fixture_server(directory, port=0, latency=0.0):
+    """
+    Start the fixture server on a background thread. Returns (server, base_url);
+    call server.shutdown() when done.
+    """
+    handler = partial(FixtureHandler, directory=directory, latency=latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve saved myscheme pages for offline testing")
+    parser.add_argument("directory", help="Directory of saved pages (e.g. schemes/pm-kisan.html)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Artificial delay per request in seconds")
+    args = parser.parse_args()
+
+    server, base_url = start_fixture_server(args.directory, args.port, args.latency)
+    print(f"🌐 Serving {args.directory} at {base_url} (Ctrl-C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
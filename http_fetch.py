@@ -0,0 +1,53 @@
+import time
+
+from metrics import metrics
+from rate_limiter import parse_retry_after
+
+try:
+    import httpx
+except ImportError:  # only needed for the browserless fetch mode
+    httpx = None
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+
+http_fetch_seconds = metrics.histogram("http_fetch_seconds", "Time to fetch a scheme page over plain HTTP")
+
+def create_http_client(concurrency=8, timeout=30.0):
+    """
+    Create a pooled async HTTP client sized for the given number of workers
+    """
+    if httpx is None:
+        raise ImportError("httpx is required for the HTTP fetch mode (pip install httpx)")
+
+    return httpx.AsyncClient(
+        headers={"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml"},
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        timeout=timeout,
+        follow_redirects=True
+    )
+
+async def fetch_scheme_html(client, full_link, rate_limiter=None):
+    """
+    Fetch the server-rendered HTML of a scheme page over plain HTTP
+    """
+    if rate_limiter:
+        await rate_limiter.acquire(full_link)
+    started = time.monotonic()
+    try:
+        response = await client.get(full_link)
+    except Exception:
+        http_fetch_seconds.observe(time.monotonic() - started, status="error")
+        if rate_limiter:
+            rate_limiter.record(full_link, time.monotonic() - started, error=True)
+        raise
+    http_fetch_seconds.observe(time.monotonic() - started, status=response.status_code)
+    if rate_limiter:
+        rate_limiter.record(
+            full_link, time.monotonic() - started, status=response.status_code,
+            retry_after=parse_retry_after(response.headers.get('retry-after'))
+        )
+    response.raise_for_status()
+    return response.text
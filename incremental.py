@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+
+from dedup import canonical_url
+from scheme_extractor import SECTIONS, extract_sections_from_html, has_content
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    link TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    checked_at REAL NOT NULL,
+    changed_at REAL NOT NULL
+);
+"""
+
+def content_fingerprint(details):
+    """
+    Stable hash of a scheme's extracted sections (listing fields are ignored)
+    """
+    sections = {key: details.get(key, "") for key in SECTIONS}
+    payload = json.dumps(sections, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class FingerprintStore:
+    """
+    Persistent per-link fingerprints and HTTP validators, kept across crawls
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, link):
+        """
+        Return (content_hash, etag, last_modified) for a link, or None if never seen
+        """
+        return self.conn.execute(
+            "SELECT content_hash, etag, last_modified FROM fingerprints WHERE link = ?", (link,)
+        ).fetchone()
+
+    def record(self, link, content_hash, etag=None, last_modified=None):
+        now = time.time()
+        with self.conn:
+            row = self.conn.execute(
+                "SELECT content_hash, changed_at FROM fingerprints WHERE link = ?", (link,)
+            ).fetchone()
+            changed_at = row[1] if row and row[0] == content_hash else now
+            self.conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (link, content_hash, etag, last_modified, checked_at, changed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (link, content_hash, etag, last_modified, now, changed_at)
+            )
+
+async def check_for_change(client, link, stored, previous_record, rate_limiter=None):
+    """
+    Cheap change check for one scheme page.
+
+    Sends a conditional GET with the stored validators; a 304 means unchanged.
+    Otherwise the server-rendered HTML is parsed and its fingerprint compared with the
+    stored one (or, on the first incremental run, with the previous record's sections).
+
+    Returns (changed, fingerprint, details, html) where fingerprint is (content_hash, etag,
+    last_modified) or None when the page couldn't be checked, and details and html are the
+    parsed sections and the page itself, or None after a 304, so a changed page doesn't
+    have to be fetched and parsed again.
+    """
+    headers = {}
+    if stored:
+        if stored[1]:
+            headers['If-None-Match'] = stored[1]
+        if stored[2]:
+            headers['If-Modified-Since'] = stored[2]
+
+    if rate_limiter:
+        await rate_limiter.acquire(link)
+    started = time.monotonic()
+    try:
+        response = await client.get(link, headers=headers)
+    except Exception:
+        if rate_limiter:
+            rate_limiter.record(link, time.monotonic() - started, error=True)
+        raise
+    if rate_limiter:
+        rate_limiter.record(link, time.monotonic() - started, status=response.status_code)
+    if response.status_code == 304 and stored:
+        return False, stored, None, None
+    response.raise_for_status()
+
+    html = response.text
+    # Parsing is CPU work, keep it off the event loop
+    details = await asyncio.to_thread(extract_sections_from_html, html)
+    if not has_content(details):
+        return True, None, details, html
+
+    fingerprint = (
+        content_fingerprint(details),
+        response.headers.get('etag'),
+        response.headers.get('last-modified')
+    )
+    if stored:
+        baseline_hash = stored[0]
+    elif previous_record:
+        baseline_hash = content_fingerprint(previous_record)
+    else:
+        return True, fingerprint, details, html
+    return fingerprint[0] != baseline_hash, fingerprint, details, html
+
+def load_previous_records(path):
+    """
+    Index a previous crawl's JSON output by canonical link
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return {canonical_url(record['link']): record for record in json.load(f) if record.get('link')}
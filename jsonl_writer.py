@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import textwrap
+
+from dedup import canonical_url
+
+logger = logging.getLogger(__name__)
+
+def _drop_partial_line(path, chunk_size=1 << 16):
+    """
+    Truncate a file back to just after its last newline
+    """
+    try:
+        f = open(path, 'rb+')
+    except FileNotFoundError:
+        return
+    with f:
+        size = end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - chunk_size)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            logger.warning("Dropping a partial last JSONL line", extra={"path": path, "bytes": size - end})
+            f.truncate(end)
+
+class JsonlWriter:
+    """
+    Append one compact JSON record per line, flushing to disk every `flush_every` records.
+    Opened in append mode so a resumed crawl keeps adding to the same file, after
+    dropping a partial last line a crash left behind (it would swallow the next record).
+    write() returns True when the record (and every one before it) reached the disk.
+    """
+
+    def __init__(self, path, flush_every=10, append=True):
+        self.path = path
+        self.flush_every = flush_every
+        self.count = 0
+        self._unflushed = 0
+        if append:
+            _drop_partial_line(path)
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        self.file.write('\n')
+        self.count += 1
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._unflushed = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def iter_jsonl(path):
+    """
+    Yield records from a JSONL file one at a time. A truncated last line
+    (left behind by a crash mid-write) is skipped.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Skipping unreadable JSONL line", extra={"path": path})
+
+def iter_json_array(path, chunk_size=1 << 16):
+    """
+    Yield the objects of a JSON array file one at a time, reading the file in chunks
+    instead of loading it whole. Raises json.JSONDecodeError on a malformed file.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith('['):
+            raise json.JSONDecodeError("Expecting a JSON array", buffer, 0)
+        buffer = buffer[1:]
+        while True:
+            buffer = buffer.lstrip()
+            if buffer.startswith(','):
+                buffer = buffer[1:].lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                # The next object runs past what has been read so far
+                more = f.read(chunk_size)
+                if not more:
+                    raise
+                buffer += more
+                continue
+            yield item
+            buffer = buffer[end:]
+
+def iter_records(path):
+    """
+    Yield records from a crawl output, either JSONL or a pretty JSON array, one at a time
+    """
+    if path.endswith('.jsonl'):
+        yield from iter_jsonl(path)
+    else:
+        yield from iter_json_array(path)
+
+def write_json_array(records, dst):
+    """
+    Stream records into a pretty-printed JSON array identical to
+    json.dump(records, f, indent=2, ensure_ascii=False), one record in memory at a time.
+    Returns the number of records written.
+    """
+    count = 0
+    tmp_path = dst + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write('[\n' if count == 0 else ',\n')
+            f.write(textwrap.indent(json.dumps(record, indent=2, ensure_ascii=False), '  '))
+            count += 1
+        f.write('\n]' if count else '[]')
+    os.replace(tmp_path, dst)
+    return count
+
+def _link_key(record):
+    link = record.get('link')
+    if not link or link == "No link found":
+        return None
+    return canonical_url(link)
+
+def _scan_jsonl(path):
+    """
+    Yield (byte offset, record) for each readable line of a JSONL file
+    """
+    with open(path, 'rb') as f:
+        offset = 0
+        for line in f:
+            start, offset = offset, offset + len(line)
+            if not line.strip():
+                continue
+            try:
+                yield start, json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Skipping unreadable JSONL line", extra={"path": path})
+
+def latest_records(path, order=None):
+    """
+    Yield the records of a JSONL file, keeping only the last record of each scheme
+    (by canonical link). Schemes written again by a resumed or restarted crawl are
+    listed once. With `order`, a list of links (e.g. in discovery order), those schemes
+    come first in that order; the rest follow where they last appear in the file.
+    Only the links and their line offsets are held in memory.
+    """
+    last = {}
+    unkeyed = []
+    for offset, record in _scan_jsonl(path):
+        key = _link_key(record)
+        if key is None:
+            unkeyed.append(offset)
+        else:
+            last[key] = offset
+    ordered = []
+    for link in order or ():
+        offset = last.pop(canonical_url(link), None)
+        if offset is not None:
+            ordered.append(offset)
+    with open(path, 'rb') as f:
+        for offset in ordered + sorted([*last.values(), *unkeyed]):
+            f.seek(offset)
+            yield json.loads(f.readline())
+
+def jsonl_to_json(src, dst, order=None):
+    """
+    Convert a JSONL file into the pretty JSON array format the rest of the project reads,
+    one record per scheme, in the order of the `order` links when given
+    """
+    return write_json_array(latest_records(src, order), dst)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a JSONL crawl output into a pretty JSON array")
+    parser.add_argument("src", help="JSONL file, one record per line")
+    parser.add_argument("dst", help="JSON file to write")
+    parser.add_argument("--state", help="crawl state whose discovery order the records follow")
+    args = parser.parse_args()
+
+    order = None
+    if args.state:
+        from crawl_state import CrawlState
+        with CrawlState(args.state) as state:
+            order = state.links()
+    total = jsonl_to_json(args.src, args.dst, order)
+    print(f"💾 Wrote {total} records to '{args.dst}'")
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+
+from scheme_extractor import card_to_scheme, extract_listing_cards
+from browser_pool import CRASH_RETRIES, BrowserCrashed
+from page_loading import get_last_listed_page, open_listing_page, wait_for_listing_ready
+
+logger = logging.getLogger(__name__)
+
+async def scrape_page_schemes(page, page_number):
+    """
+    Extract all scheme links and basic info from current page.
+    Returns an empty list when the page rendered without any scheme card and None
+    when the page couldn't be read.
+    """
+    schemes = []
+    
+    try:
+        # Opening the page already waited for the cards; this only catches a page still rendering
+        try:
+            await wait_for_listing_ready(page, timeout=5000)
+        except Exception:
+            logger.warning("No scheme cards after 5s, checking the page anyway", extra={"page": page_number})
+        
+        # Read every card on the page in a single round trip
+        listing = await extract_listing_cards(page)
+        
+        current_url = listing['url']
+        
+        # Check if we're on an unexpected page (like DigiLocker)
+        if 'digilocker' in current_url.lower() or 'signinv2' in current_url.lower() or 'signin' in current_url.lower():
+            logger.warning("Detected authentication/login page, skipping", extra={"page": page_number, "url": current_url})
+            return None
+        
+        if not listing['selector']:
+            logger.warning("No scheme elements found", extra={
+                "page": page_number, "url": current_url, "title": listing['pageTitle'],
+                "links": listing['totalLinks'], "scheme_like_links": len(listing['schemeLikeLinks'])
+            })
+            for href in listing['schemeLikeLinks']:
+                logger.debug("Found scheme-like link", extra={"page": page_number, "href": href})
+            return schemes
+        
+        logger.debug("Found scheme elements", extra={
+            "page": page_number, "cards": len(listing['cards']), "selector": listing['selector']
+        })
+        
+        # Clean and format the data
+        for card in listing['cards']:
+            schemes.append(card_to_scheme(card, page_number))
+    
+    except Exception as e:
+        logger.error("Error extracting schemes", extra={"page": page_number, "error": str(e)})
+        return None
+    
+    return schemes
+
+async def listing_worker(worker_id, pool, listing_url, queue, emit, failed_pages, last_page, state=None, rate_limiter=None):
+    """
+    Open each queued listing page directly on a page leased from the pool, scrape its
+    cards and hand them to `emit` straight away. The listing only ends early when the
+    pager, driven as far as it goes, lists fewer pages than the one asked for. Any other
+    failure, including a page without cards, is recorded for that page only; a
+    page interrupted by a browser crash is tried again, up to CRASH_RETRIES times.
+    """
+    while True:
+        page_number = await queue.get()
+        if page_number is None:
+            break
+
+        # Past the last page of results, nothing left to do
+        if page_number > last_page[0]:
+            continue
+
+        logger.debug("Collecting links", extra={"shard": worker_id, "page": page_number})
+        try:
+            crashes = 0
+            while True:
+                try:
+                    async with pool.page() as page:
+                        opened = await open_listing_page(page, listing_url, page_number, rate_limiter=rate_limiter)
+                        if opened:
+                            page_schemes = await scrape_page_schemes(page, page_number)
+                        else:
+                            listed_pages = await get_last_listed_page(page)
+                    break
+                except BrowserCrashed:
+                    crashes += 1
+                    if crashes > CRASH_RETRIES:
+                        raise
+                    logger.info("Browser restarted, collecting the page again", extra={"shard": worker_id, "page": page_number})
+
+            if not opened:
+                if listed_pages is not None and listed_pages < page_number:
+                    # The pager stops before this page, so the listing ends there
+                    logger.info("The listing ends earlier", extra={"shard": worker_id, "page": page_number, "last_page": listed_pages})
+                    last_page[0] = min(last_page[0], listed_pages)
+                else:
+                    logger.warning("Could not reach the listing page", extra={"shard": worker_id, "page": page_number})
+                    failed_pages.append(page_number)
+                continue
+
+            if not page_schemes:
+                logger.warning("Could not read the listing page", extra={
+                    "shard": worker_id, "page": page_number, "unreadable": page_schemes is None
+                })
+                failed_pages.append(page_number)
+                continue
+
+            if state:
+                state.record_listing_page(page_number, page_schemes)
+            logger.debug("Listing page collected", extra={"shard": worker_id, "page": page_number, "schemes": len(page_schemes)})
+            await emit(page_schemes)
+
+        except Exception as e:
+            logger.error("Error collecting links", extra={"shard": worker_id, "page": page_number, "error": str(e)})
+            failed_pages.append(page_number)
+
+async def discover_listing_links(pool, listing_url, max_pages, emit, shards=4, state=None, rate_limiter=None):
+    """
+    Spread listing pages over several workers sharing a browser pool, opening each page
+    directly instead of clicking through the pager. Schemes are passed to `emit` page by
+    page as soon as they are found, so the detail stages can start on the first page.
+    Pages already recorded in the crawl state are emitted without being scraped again.
+    With a rate limiter, every listing navigation shares the host's budget with the detail pages.
+    Returns the listing pages that failed.
+    """
+    queue = asyncio.Queue()
+    stored_pages = 0
+    for page_number in range(1, max_pages + 1):
+        stored = state.listing_page(page_number) if state else None
+        if stored:
+            stored_pages += 1
+            await emit(stored)
+        else:
+            queue.put_nowait(page_number)
+
+    pending_pages = queue.qsize()
+    shards = max(1, min(shards, pending_pages or 1))
+    logger.info("Collecting listing pages", extra={"pages": pending_pages, "shards": shards, "already_collected": stored_pages})
+    for _ in range(shards):
+        queue.put_nowait(None)
+
+    failed_pages = []
+    last_page = [max_pages]
+    outcomes = await asyncio.gather(
+        *(listing_worker(n + 1, pool, listing_url, queue, emit, failed_pages, last_page, state, rate_limiter)
+          for n in range(shards)),
+        return_exceptions=True
+    )
+    for n, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            logger.error("Listing shard stopped early", extra={"shard": n + 1, "error": repr(outcome)})
+
+    failed_pages = sorted(p for p in failed_pages if p <= last_page[0])
+    if failed_pages:
+        logger.warning("Listing pages failed and will be retried on the next run", extra={"pages": failed_pages})
+    elif state:
+        state.mark_listing_complete()
+    return failed_pages
@@ -0,0 +1,193 @@
+import json
+import math
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a fast in-page evaluate to a slow page load
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _label_text(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in key) + "}"
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def reset(self):
+        self.values = {}
+
+    def prometheus(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_label_text(key)} {value}")
+        return lines
+
+    def summary(self):
+        return {_label_text(key) or "total": value for key, value in sorted(self.values.items())}
+
+class _Series:
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = _Series(self.buckets)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        series.counts[index] += 1
+        series.count += 1
+        series.sum += value
+        series.max = max(series.max, value)
+
+    def reset(self):
+        self.series = {}
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe how long the block takes, also when it raises. Works around awaits:
+
+            with histogram.time(step='goto'):
+                await page.goto(url)
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def quantile(self, q, **labels):
+        """
+        Estimate a quantile from the buckets, interpolating inside the bucket like Prometheus does
+        """
+        series = self.series.get(_label_key(labels))
+        return self._quantile(series, q) if series else None
+
+    def _quantile(self, series, q):
+        rank = q * series.count
+        seen = 0
+        for i, count in enumerate(series.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else series.max
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return series.max
+
+    def prometheus(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series.counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(f"{self.name}_bucket{_label_text(key + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(key)} {series.sum}")
+            lines.append(f"{self.name}_count{_label_text(key)} {series.count}")
+        return lines
+
+    def summary(self):
+        return {
+            _label_text(key) or "total": {
+                "count": series.count,
+                "sum": round(series.sum, 6),
+                "mean": round(series.sum / series.count, 6),
+                "p50": round(self._quantile(series, 0.5), 6),
+                "p95": round(self._quantile(series, 0.95), 6),
+                "max": round(series.max, 6)
+            }
+            for key, series in sorted(self.series.items())
+        }
+
+class Metrics:
+    """
+    A small registry of counters and latency histograms, exportable as Prometheus
+    text or a JSON summary. Metrics are created on first use, so instrumented code
+    just asks for them by name.
+    """
+
+    def __init__(self, prefix="scrape_"):
+        self.prefix = prefix
+        self.metrics = {}
+
+    def counter(self, name, help_text=""):
+        return self._get(Counter, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets)
+
+    def _get(self, kind, name, *args):
+        name = self.prefix + name
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = kind(name, *args)
+        elif not isinstance(metric, kind):
+            raise TypeError(f"{name} is already registered as a {type(metric).__name__}")
+        return metric
+
+    def reset(self):
+        """
+        Zero every metric. The metrics stay registered, since modules hold on to them.
+        """
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def to_prometheus(self):
+        lines = []
+        for name in sorted(self.metrics):
+            lines.extend(self.metrics[name].prometheus())
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        return {name: self.metrics[name].summary() for name in sorted(self.metrics)}
+
+    def slowest(self, limit=10):
+        """
+        Histogram series ordered by total time spent, to show which step dominates.
+        Returns (name, labels, total seconds, count) tuples.
+        """
+        rows = []
+        for name, metric in self.metrics.items():
+            if isinstance(metric, Histogram):
+                for key, series in metric.series.items():
+                    rows.append((name, _label_text(key), series.sum, series.count))
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows[:limit]
+
+    def write(self, path):
+        """
+        Write the metrics to `path`: a JSON summary for *.json, Prometheus text otherwise
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                json.dump(self.summary(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+
+# Shared by every module of a crawl
+metrics = Metrics()
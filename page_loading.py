@@ -0,0 +1,297 @@
+import logging
+import time
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+from metrics import metrics
+from rate_limiter import parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+goto_seconds = metrics.histogram("goto_seconds", "Time until domcontentloaded after page.goto")
+ready_wait_seconds = metrics.histogram("ready_wait_seconds", "Time spent waiting for a page to be ready to extract")
+pager_clicks = metrics.counter("pager_clicks_total", "Pager clicks needed to reach a listing page")
+
+# Resource types the extractor never reads. Documents, scripts and XHR/fetch are
+# kept because the listing cards and pager are rendered client-side.
+BLOCKED_RESOURCE_TYPES = {
+    "image",
+    "media",
+    "font",
+    "texttrack",
+    "eventsource",
+    "websocket",
+    "manifest"
+}
+
+# Analytics, tag managers and chat widgets (matched on the host suffix)
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "analytics.google.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "facebook.net",
+    "facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "newrelic.com",
+    "nr-data.net",
+    "sentry.io"
+)
+
+# A scheme page is ready once any of the given section headings is in the DOM
+SCHEME_READY_JS = """
+(headings) => {
+    for (const el of document.querySelectorAll('h1, h2, h3, h4')) {
+        if (headings.includes((el.textContent || '').trim())) return true;
+    }
+    return false;
+}
+"""
+
+LISTING_CARD_SELECTOR = 'a[href*="/schemes/"]'
+
+# The highlighted page number in the listing pager
+ACTIVE_PAGE_SELECTOR = 'li.bg-green-700'
+
+# A listing page is ready once cards are rendered and, after a pagination click, the
+# cards are the new page's: the first card changed and, when we know which page we
+# asked for, the pager highlights it. The pager alone can move before the cards do.
+LISTING_READY_JS = """
+({selector, activeSelector, previous, expectedPage}) => {
+    // Auth redirects end the wait too, the caller checks the URL afterwards
+    if (/digilocker|signin/i.test(location.href)) return true;
+    const first = document.querySelector(selector);
+    if (!first) return false;
+    if (previous !== null && first.getAttribute('href') === previous) return false;
+    if (expectedPage !== null) {
+        const active = document.querySelector(activeSelector);
+        return !!active && (active.textContent || '').trim() === String(expectedPage);
+    }
+    return true;
+}
+"""
+
+# Clicks the pager entry for the target page, or the highest visible page number
+# below it when the target isn't rendered yet. Returns the page number clicked,
+# or null when the pager can't get any closer.
+PAGER_JUMP_JS = """
+({target, activeSelector}) => {
+    const active = document.querySelector(activeSelector);
+    let best = null;
+    let bestNumber = -1;
+    for (const li of document.querySelectorAll('li')) {
+        const text = (li.textContent || '').trim();
+        if (!/^\\d+$/.test(text)) continue;
+        const number = parseInt(text, 10);
+        if (number === target) {
+            best = li;
+            bestNumber = number;
+            break;
+        }
+        if (number < target && number > bestNumber) {
+            best = li;
+            bestNumber = number;
+        }
+    }
+    if (!best || best === active) return null;
+    best.scrollIntoView();
+    best.click();
+    return bestNumber;
+}
+"""
+
+# Highest page number in the listing pager, or null when there is no pager
+PAGER_LAST_PAGE_JS = """
+() => {
+    let last = null;
+    for (const li of document.querySelectorAll('li')) {
+        const text = (li.textContent || '').trim();
+        if (/^\\d+$/.test(text)) last = Math.max(last || 0, parseInt(text, 10));
+    }
+    return last;
+}
+"""
+
+# Total time the event-driven waits saved compared with the old fixed sleeps
+wait_stats = {"waits": 0, "saved_seconds": 0.0}
+
+def report_wait(label, started, fixed_seconds):
+    """
+    Log how long a wait took and how much it saved against the fixed sleep it replaced
+    """
+    elapsed = time.monotonic() - started
+    saved = max(0.0, fixed_seconds - elapsed)
+    wait_stats["waits"] += 1
+    wait_stats["saved_seconds"] += saved
+    logger.debug("%s ready", label, extra={"elapsed": round(elapsed, 3), "saved": round(saved, 3), "fixed_wait": fixed_seconds})
+
+def is_blocked_request(resource_type, url):
+    """
+    Decide whether a request is an asset or tracker we don't need for extraction
+    """
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = (urlparse(url).hostname or "").lower()
+    return any(host == blocked or host.endswith("." + blocked) for blocked in BLOCKED_HOSTS)
+
+async def apply_resource_policy(target):
+    """
+    Route every request of a page or browser context through the block list.
+    Opt-in: call it once on the context (or page) before navigating.
+    """
+    async def handle(route):
+        request = route.request
+        if is_blocked_request(request.resource_type, request.url):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await target.route("**/*", handle)
+
+async def first_card_link(page):
+    """
+    Return the href of the first scheme card on a listing page, or None
+    """
+    return await page.evaluate(
+        "selector => { const a = document.querySelector(selector); return a ? a.getAttribute('href') : null; }",
+        LISTING_CARD_SELECTOR
+    )
+
+async def wait_for_listing_ready(page, previous_first_link=None, timeout=30000, expected_page=None):
+    """
+    Wait until listing cards are in the DOM and, after a pagination click, the page
+    shows the new results. The timeout is the ceiling, not a fixed delay.
+    """
+    with ready_wait_seconds.time(page="listing"):
+        await page.wait_for_function(
+            LISTING_READY_JS,
+            arg={
+                "selector": LISTING_CARD_SELECTOR,
+                "activeSelector": ACTIVE_PAGE_SELECTOR,
+                "previous": previous_first_link,
+                "expectedPage": expected_page
+            },
+            timeout=timeout
+        )
+
+def listing_page_url(base_url, page_number):
+    """
+    URL of a listing page, with the page number as a query parameter
+    """
+    parts = urlparse(base_url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k != 'page']
+    if page_number > 1:
+        query.append(('page', str(page_number)))
+    return urlunparse(parts._replace(query=urlencode(query)))
+
+async def get_active_page(page):
+    """
+    Page number highlighted in the listing pager, or None if there is no pager
+    """
+    text = await page.evaluate(
+        "selector => { const el = document.querySelector(selector); return el ? el.textContent.trim() : null; }",
+        ACTIVE_PAGE_SELECTOR
+    )
+    return int(text) if text and text.isdigit() else None
+
+async def get_last_listed_page(page):
+    """
+    Highest page number the listing pager offers, or None if there is no pager
+    """
+    return await page.evaluate(PAGER_LAST_PAGE_JS)
+
+async def open_listing_page(page, base_url, page_number, max_pager_steps=20, timeout=30000, rate_limiter=None):
+    """
+    Open listing page N directly. Tries the page URL parameter first; if the site
+    ignores it, drives the pager from wherever it is, jumping to the furthest visible
+    page number each step instead of clicking 1..N-1 one by one.
+    With a rate limiter, the navigation and every pager click take from the host's budget.
+    Returns True once the pager shows page N, and False when the pager can't get any
+    closer to it. Raises if page N is still out of reach after `max_pager_steps` clicks.
+    """
+    await goto_listing_page(
+        page, listing_page_url(base_url, page_number), timeout=timeout, rate_limiter=rate_limiter,
+        label=f"Listing page {page_number}"
+    )
+    active = await get_active_page(page)
+    if active == page_number or (active is None and page_number == 1):
+        return True
+
+    for _ in range(max_pager_steps):
+        previous_first_link = await first_card_link(page)
+        if rate_limiter:
+            # A click fetches the next page of results; its timing includes rendering, so it isn't fed back
+            await rate_limiter.acquire(page.url)
+        started = time.monotonic()
+        clicked = await page.evaluate(
+            PAGER_JUMP_JS, {"target": page_number, "activeSelector": ACTIVE_PAGE_SELECTOR}
+        )
+        if clicked is None:
+            return False
+        pager_clicks.inc()
+        await wait_for_listing_ready(page, previous_first_link, timeout=timeout, expected_page=clicked)
+        # Each click used to be followed by a fixed 3s sleep
+        report_wait(f"Pagination to page {clicked}", started, 3)
+        if clicked == page_number:
+            return True
+
+    raise RuntimeError(f"Listing page {page_number} not reached after {max_pager_steps} pager steps")
+
+async def navigate(page, url, kind, timeout=30000, rate_limiter=None):
+    """
+    page.goto() until domcontentloaded. With a rate limiter, the navigation waits for the
+    host's budget and reports back the time to the response, so slow client-side
+    rendering afterwards doesn't read as a slow server.
+    Returns (response, the moment the navigation started, after the budget wait).
+    """
+    if rate_limiter:
+        await rate_limiter.acquire(url)
+    started = time.monotonic()
+    try:
+        with goto_seconds.time(page=kind):
+            response = await page.goto(url, wait_until='domcontentloaded', timeout=timeout)
+    except Exception:
+        if rate_limiter:
+            rate_limiter.record(url, time.monotonic() - started, error=True)
+        raise
+    if rate_limiter:
+        rate_limiter.record(
+            url, time.monotonic() - started,
+            status=response.status if response else None,
+            retry_after=parse_retry_after(response.headers.get('retry-after')) if response else None
+        )
+    return response, started
+
+async def goto_scheme_page(page, url, headings, timeout=30000, ready_timeout=10000, rate_limiter=None):
+    """
+    Open a scheme page and return as soon as its content headings are in the DOM.
+    Pages that never show a known heading fall back to waiting for network idle.
+    """
+    response, _ = await navigate(page, url, "scheme", timeout, rate_limiter)
+    started = time.perf_counter()
+    strategy = "headings"
+    try:
+        await page.wait_for_function(SCHEME_READY_JS, arg=list(headings), timeout=ready_timeout)
+    except Exception:
+        strategy = "networkidle"
+        await page.wait_for_load_state('networkidle', timeout=timeout)
+    finally:
+        ready_wait_seconds.observe(time.perf_counter() - started, page="scheme", strategy=strategy)
+    return response
+
+async def goto_listing_page(page, url, timeout=30000, ready_timeout=10000, rate_limiter=None, label=None):
+    """
+    Open a listing page and return as soon as the scheme cards are rendered. A page
+    past the end of the results never shows any; it is returned after `ready_timeout`
+    for the caller to find no cards there. With a `label`, the time from the start of
+    the navigation is reported against the fixed 5s sleep it replaced.
+    """
+    response, started = await navigate(page, url, "listing", timeout, rate_limiter)
+    try:
+        await wait_for_listing_ready(page, timeout=ready_timeout)
+    except Exception:
+        logger.debug("No scheme cards rendered", extra={"url": url, "waited": ready_timeout / 1000})
+    if label:
+        report_wait(label, started, 5)
+    return response
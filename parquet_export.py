@@ -0,0 +1,144 @@
+import logging
+import os
+import time
+
+from jsonl_writer import iter_records
+from scheme_extractor import SECTIONS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed for the columnar export
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+LISTING_COLUMNS = ("title", "description", "link")
+
+def scheme_schema():
+    """
+    One column per listing field and per section, plus crawl metadata:
+    the listing page the scheme was found on, its tags, the category/state
+    facets it was listed under, which crawl wrote the row and when
+    """
+    return pa.schema(
+        [(name, pa.string()) for name in LISTING_COLUMNS]
+        + [(key, pa.string()) for key in SECTIONS]
+        + [
+            ("page_found", pa.int32()),
+            ("tags", pa.list_(pa.string())),
+            ("facets", pa.list_(pa.string())),
+            ("crawl_id", pa.string()),
+            ("exported_at", pa.timestamp("s", tz="UTC")),
+        ]
+    )
+
+class ParquetExporter:
+    """
+    Write scheme records into a directory of zstd-compressed Parquet files.
+
+    Records are buffered and written `batch_size` at a time, each batch as its own
+    part file (part-<crawl_id>-00000.parquet, ...), so a later crawl appends new
+    files next to the old ones instead of rewriting them. The directory reads back
+    as one table, and readers only decode the columns they ask for:
+
+        read_schemes('schemes_parquet', columns=['title', 'link', 'eligibility'])
+
+    Used like JsonlWriter, as a context manager that flushes on close.
+    """
+
+    def __init__(self, directory, crawl_id=None, batch_size=5000, compression='zstd', compression_level=9):
+        if pa is None:
+            raise ImportError("pyarrow is required for the Parquet export (pip install pyarrow)")
+        self.directory = directory
+        self.crawl_id = crawl_id or time.strftime('%Y%m%dT%H%M%S')
+        self.batch_size = batch_size
+        self.compression = compression
+        self.compression_level = compression_level
+        self.schema = scheme_schema()
+        self.count = 0
+        self.parts = 0
+        self._rows = []
+        os.makedirs(directory, exist_ok=True)
+        # Reusing a crawl id appends after its existing parts instead of overwriting them
+        prefix = f"part-{self.crawl_id}-"
+        self._first_part = sum(1 for name in os.listdir(directory) if name.startswith(prefix) and name.endswith('.parquet'))
+
+    def write(self, record):
+        self._rows.append(record)
+        self.count += 1
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        exported_at = int(time.time())
+        columns = {name: [row.get(name) for row in self._rows] for name in LISTING_COLUMNS + tuple(SECTIONS)}
+        columns["page_found"] = [row.get("page_found") for row in self._rows]
+        columns["tags"] = [row.get("tags") for row in self._rows]
+        columns["facets"] = [row.get("facets") for row in self._rows]
+        columns["crawl_id"] = [self.crawl_id] * len(self._rows)
+        columns["exported_at"] = [exported_at] * len(self._rows)
+        table = pa.Table.from_pydict(columns, schema=self.schema)
+
+        name = f"part-{self.crawl_id}-{self._first_part + self.parts:05d}.parquet"
+        path = os.path.join(self.directory, name)
+        # Readers of the directory skip files starting with '_', so never see a half-written one
+        tmp_path = os.path.join(self.directory, f"_{name}.tmp")
+        pq.write_table(table, tmp_path, compression=self.compression, compression_level=self.compression_level)
+        os.replace(tmp_path, path)
+        self.parts += 1
+        self._rows = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_schemes(directory, columns=None, filters=None):
+    """
+    Read the exported dataset as one Arrow table, decoding only `columns`.
+    `filters` are pyarrow predicates, e.g. [('crawl_id', '=', '20250101T000000')].
+    Every crawl's rows are kept; pick one with the crawl_id column.
+    """
+    if pq is None:
+        raise ImportError("pyarrow is required to read the Parquet export (pip install pyarrow)")
+    return pq.read_table(directory, columns=columns, filters=filters)
+
+def export_parquet(src, directory, crawl_id=None, batch_size=5000):
+    """
+    Append the records of a JSON or JSONL crawl output to the Parquet dataset.
+    Returns (records written, part files written).
+    """
+    with ParquetExporter(directory, crawl_id, batch_size) as exporter:
+        for record in iter_records(src):
+            exporter.write(record)
+    return exporter.count, exporter.parts
+
+if __name__ == "__main__":
+    import argparse
+
+    from structured_logging import configure_logging
+
+    parser = argparse.ArgumentParser(description="Append scheme records to a columnar Parquet dataset")
+    parser.add_argument("src", help="crawl output, JSON array or JSONL")
+    parser.add_argument("directory", help="Parquet dataset directory, one part file per batch")
+    parser.add_argument("--crawl-id", help="label stored with every row (default: the current time)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="records per part file (default: 5000)")
+    args = parser.parse_args()
+    configure_logging()
+
+    started = time.monotonic()
+    written, parts = export_parquet(args.src, args.directory, args.crawl_id, args.batch_size)
+    size = sum(os.path.getsize(os.path.join(args.directory, name))
+               for name in os.listdir(args.directory) if name.endswith('.parquet'))
+    logger.info("Parquet export", extra={
+        "records": written, "parts": parts, "path": args.directory, "total_kb": round(size / 1024),
+        "seconds": round(time.monotonic() - started, 1)
+    })
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urlparse
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+rate_limit_wait_seconds = metrics.histogram("rate_limit_wait_seconds", "Time spent waiting for the host's request budget")
+rate_limit_backoffs = metrics.counter("rate_limit_backoffs_total", "Times a host's request rate was cut")
+
+class _HostBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.lock = asyncio.Lock()
+
+class AdaptiveRateLimiter:
+    """
+    Per-host token bucket shared by every worker, with the rate tuned by AIMD:
+    each healthy response adds `increase` requests/sec, while a slow response,
+    a 429 or a 5xx multiplies the rate by `decrease`. A Retry-After header pauses
+    the host for that long.
+    """
+
+    def __init__(self, initial_rate=1.0, min_rate=0.2, max_rate=8.0, burst=2,
+                 increase=0.1, decrease=0.5, slow_seconds=8.0):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_seconds = slow_seconds
+        self.buckets = {}
+
+    def _bucket(self, url):
+        host = urlparse(url).hostname or ""
+        if host not in self.buckets:
+            self.buckets[host] = _HostBucket(self.initial_rate, self.burst)
+        return self.buckets[host]
+
+    async def acquire(self, url):
+        """
+        Wait until the host's budget allows another request
+        """
+        bucket = self._bucket(url)
+        with rate_limit_wait_seconds.time():
+            await self._take(bucket)
+
+    async def _take(self, bucket):
+        async with bucket.lock:
+            while True:
+                now = time.monotonic()
+                if now < bucket.paused_until:
+                    await asyncio.sleep(bucket.paused_until - now)
+                    continue
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+                bucket.updated = now
+                if bucket.tokens >= 1:
+                    bucket.tokens -= 1
+                    return
+                await asyncio.sleep((1 - bucket.tokens) / bucket.rate)
+
+    def record(self, url, latency, status=None, error=False, retry_after=None):
+        """
+        Feed back the outcome of a request to adjust the host's rate
+        """
+        bucket = self._bucket(url)
+        now = time.monotonic()
+        struggling = error or status == 429 or (status is not None and status >= 500) or latency > self.slow_seconds
+
+        if struggling:
+            # Many workers see the same overload at once; back off once per round trip
+            if now - bucket.last_decrease >= min(latency, 1 / bucket.rate):
+                bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+                bucket.last_decrease = now
+                rate_limit_backoffs.inc(host=urlparse(url).hostname)
+                logger.warning("Backing off host", extra={
+                    "host": urlparse(url).hostname, "rate": round(bucket.rate, 2), "status": status, "latency": round(latency, 1)
+                })
+            if retry_after:
+                bucket.paused_until = max(bucket.paused_until, now + retry_after)
+        else:
+            bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+
+    def rate(self, url):
+        return self._bucket(url).rate
+
+def parse_retry_after(value):
+    """
+    Seconds from a Retry-After header given in seconds (HTTP dates are ignored)
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
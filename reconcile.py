@@ -0,0 +1,112 @@
+import logging
+
+from dedup import canonical_url
+from jsonl_writer import iter_records
+from scheme_extractor import NOT_FOUND, SECTIONS, has_content
+
+logger = logging.getLogger(__name__)
+
+def _key(record):
+    link = record.get('link')
+    if not link or link == "No link found":
+        return None
+    return canonical_url(link)
+
+def index_by_link(records):
+    """
+    Map canonical link -> record, keeping the first record of each link
+    """
+    index = {}
+    for record in records:
+        key = _key(record)
+        if key is not None and key not in index:
+            index[key] = record
+    return index
+
+def is_stale(listed, scraped):
+    """
+    A scraped record needs scraping again when it holds no section content
+    (an error page or an empty render) or the listing now shows another title
+    """
+    sections = {key: str(scraped.get(key) or NOT_FOUND) for key in SECTIONS}
+    if not has_content(sections):
+        return True
+    return bool(listed.get('title')) and listed['title'].strip() != (scraped.get('title') or '').strip()
+
+def reconcile(listed_records, scraped_records):
+    """
+    Compare the discovered schemes with the scraped records, by canonical link.
+
+    Returns a dict of scheme lists, each ready for CrawlConfig(schemes=...):
+      missing  - listed but never scraped
+      stale    - scraped, but empty, failed, or retitled since
+      orphaned - scraped, but no longer listed; scraping again shows whether the page is gone
+    Every lookup is a hash-set operation, so the cost is linear in the two inputs.
+    """
+    listed = index_by_link(listed_records)
+    scraped = index_by_link(scraped_records)
+
+    missing = [{**listed[key], 'link': key} for key in listed.keys() - scraped.keys()]
+    stale = [{**listed[key], 'link': key} for key in listed.keys() & scraped.keys()
+             if is_stale(listed[key], scraped[key])]
+    orphaned = [
+        {'title': scraped[key].get('title', 'Unknown'), 'description': scraped[key].get('description'), 'link': key}
+        for key in scraped.keys() - listed.keys()
+    ]
+
+    # Sets don't keep order; go back to listing order, then scraped order
+    order = {key: n for n, key in enumerate(list(listed) + [k for k in scraped if k not in listed])}
+    for schemes in (missing, stale, orphaned):
+        schemes.sort(key=lambda scheme: order[scheme['link']])
+    return {"missing": missing, "stale": stale, "orphaned": orphaned}
+
+def reconcile_files(listing_file, details_file, include_orphaned=True):
+    """
+    Reconcile a listing output with a details output (JSON or JSONL) and return
+    (schemes to scrape, the reconciliation). A missing details file means
+    everything listed is missing.
+    """
+    try:
+        scraped_records = list(iter_records(details_file))
+    except FileNotFoundError:
+        scraped_records = []
+    result = reconcile(iter_records(listing_file), scraped_records)
+    to_scrape = result["missing"] + result["stale"] + (result["orphaned"] if include_orphaned else [])
+    return to_scrape, result
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import json
+
+    from crawl_engine import CrawlConfig, run_crawl
+    from structured_logging import configure_logging
+
+    parser = argparse.ArgumentParser(description="Find listed schemes that are missing, stale or orphaned in the "
+                                                 "scraped details, and optionally scrape them right away")
+    parser.add_argument("--listing", default="cleaned_schemes_data.json", help="discovered schemes (JSON or JSONL)")
+    parser.add_argument("--details", default="details_cleaned.json", help="scraped records (JSON or JSONL)")
+    parser.add_argument("--skip-orphaned", action="store_true", help="don't re-check schemes that left the listing")
+    parser.add_argument("--report", help="write the three lists to this JSON file")
+    parser.add_argument("--scrape", action="store_true", help="scrape every scheme found, through the crawl engine")
+    parser.add_argument("--jsonl", default="reconciled_details.jsonl", help="where --scrape writes records")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    configure_logging()
+
+    to_scrape, result = reconcile_files(args.listing, args.details, include_orphaned=not args.skip_orphaned)
+    logger.info("Reconciled listing with details", extra={
+        "missing": len(result['missing']), "stale": len(result['stale']), "orphaned": len(result['orphaned'])
+    })
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        logger.info("Report saved", extra={"path": args.report})
+
+    if args.scrape and to_scrape:
+        summary = asyncio.run(run_crawl(CrawlConfig(
+            schemes=to_scrape, concurrency=args.concurrency, jsonl_file=args.jsonl, append=False
+        )))
+        logger.info("Reconciled schemes scraped", extra={
+            "done": summary['done'], "schemes": len(to_scrape), "failed": len(summary['failed']), "path": args.jsonl
+        })
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+
+from dedup import canonical_url
+from jsonl_writer import iter_records, write_json_array
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    link TEXT PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    record TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_by_title ON records (title, link);
+"""
+
+class RecordStore:
+    """
+    Scheme records keyed by canonical link. Adding or refreshing records is an
+    upsert per record, so a merge costs as much as the records that changed,
+    not the size of the corpus, and a crash mid-merge loses nothing already
+    committed. The pretty JSON file the rest of the project reads is produced
+    on demand with export_json(), sorted by title.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _upsert(self, record):
+        link = canonical_url(record['link'])
+        data = json.dumps({**record, 'link': link}, ensure_ascii=False)
+        content_hash = hashlib.sha256(data.encode('utf-8')).hexdigest()
+        cursor = self.conn.execute(
+            """
+            INSERT INTO records (link, title, record, content_hash, updated_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (link) DO UPDATE SET
+                title = excluded.title, record = excluded.record,
+                content_hash = excluded.content_hash, updated_at = excluded.updated_at
+            WHERE records.content_hash != excluded.content_hash
+            """,
+            (link, record.get('title') or '', data, content_hash, time.time())
+        )
+        return cursor.rowcount > 0
+
+    def upsert(self, record):
+        """
+        Insert or replace one record in its own transaction.
+        Returns False when the stored record was already identical.
+        """
+        with self.conn:
+            return self._upsert(record)
+
+    def upsert_many(self, records):
+        """
+        Upsert records in a single transaction. Returns how many were new or changed.
+        """
+        with self.conn:
+            return sum(self._upsert(record) for record in records)
+
+    def get(self, link):
+        row = self.conn.execute("SELECT record FROM records WHERE link = ?", (canonical_url(link),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, link):
+        with self.conn:
+            return self.conn.execute("DELETE FROM records WHERE link = ?", (canonical_url(link),)).rowcount > 0
+
+    def records(self):
+        """
+        Yield every record sorted by title, one at a time
+        """
+        for row in self.conn.execute("SELECT record FROM records ORDER BY title, link"):
+            yield json.loads(row[0])
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def export_json(self, path):
+        """
+        Write every record, sorted by title, to a pretty JSON array. The file is
+        replaced atomically, so readers see the old or the new version, never half.
+        Returns the number of records written.
+        """
+        return write_json_array(self.records(), path)
+
+if __name__ == "__main__":
+    import argparse
+
+    from structured_logging import configure_logging
+
+    parser = argparse.ArgumentParser(description="Keyed store of scheme records, with a sorted JSON export")
+    parser.add_argument("store", help="SQLite record store")
+    parser.add_argument("--add", nargs="*", default=[], help="JSON or JSONL files of records to upsert")
+    parser.add_argument("--export", help="write every record, sorted by title, to this JSON file")
+    args = parser.parse_args()
+    configure_logging()
+
+    with RecordStore(args.store) as store:
+        for src in args.add:
+            started = time.monotonic()
+            changed = store.upsert_many(iter_records(src))
+            logger.info("Upserted records", extra={"src": src, "changed": changed, "seconds": round(time.monotonic() - started, 2)})
+        if args.export:
+            total = store.export_json(args.export)
+            logger.info("Exported records", extra={"records": total, "path": args.export})
+        logger.info("Record store", extra={"records": len(store), "path": args.store})
@@ -1,25 +1,44 @@
 import json
+import logging
 
-# Load the original file
-with open('all_schemes_data.json', 'r', encoding='utf-8') as f:
-    data = json.load(f)
+from dedup import Deduplicator, SeenSet
+from jsonl_writer import iter_json_array, write_json_array
+from structured_logging import configure_logging
 
-print(f"Original file has {len(data)} entries")
+# Keep the seen-set in a file to also drop schemes kept by earlier runs; None dedups this file only
+SEEN_FILE = None  # e.g. 'seen_schemes.db'
 
-# Remove duplicates based on link
-seen_links = set()
-unique_schemes = []
+logger = logging.getLogger(__name__)
 
-for scheme in data:
-    link = scheme["link"]
-    if link not in seen_links:
-        seen_links.add(link)
-        unique_schemes.append(scheme)
+def main():
+    # Stream the original file, one scheme at a time
+    original = 0
 
-print(f"After removing duplicates: {len(unique_schemes)} unique schemes")
+    def schemes():
+        nonlocal original
+        for scheme in iter_json_array('all_schemes_data.json'):
+            original += 1
+            yield scheme
 
-# Save the cleaned data
-with open('cleaned_schemes_data.json', 'w', encoding='utf-8') as f:
-    json.dump(unique_schemes, f, indent=2, ensure_ascii=False)
+    # Remove duplicates based on the canonical link, so '/schemes/x' and
+    # 'https://www.myscheme.gov.in/schemes/x/' count as the same scheme.
+    # The schemes kept are saved with their link as it was in the original file.
+    with SeenSet(SEEN_FILE or ':memory:') as seen:
+        deduplicator = Deduplicator(seen)
+        unique = write_json_array(deduplicator.dedup(schemes(), canonical_links=False), 'cleaned_schemes_data.json')
 
-print("Saved cleaned data to 'cleaned_schemes_data.json'")
+    logger.info("Saved cleaned data", extra={
+        "original": original, "unique": unique, "duplicates": deduplicator.duplicates, "path": "cleaned_schemes_data.json"
+    })
+
+    # Similar titles are kept, but listed for review
+    if deduplicator.near_duplicates:
+        with open('near_duplicate_titles.json', 'w', encoding='utf-8') as f:
+            json.dump(deduplicator.near_duplicates, f, indent=2, ensure_ascii=False)
+        logger.info("Flagged near-duplicate titles", extra={
+            "titles": len(deduplicator.near_duplicates), "path": "near_duplicate_titles.json"
+        })
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
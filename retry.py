@@ -0,0 +1,140 @@
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import time
+
+from dedup import canonical_url
+from metrics import metrics
+from scheme_extractor import ERROR_PREFIX, NOT_FOUND
+
+# Error kinds, and which of them are worth retrying in the same run
+TIMEOUT = 'timeout'
+NAVIGATION = 'navigation'
+AUTH_REDIRECT = 'auth_redirect'
+EMPTY_CONTENT = 'empty_content'
+UNKNOWN = 'unknown'
+# Set by the crawl when a page keeps crashing the browser, never by classify_error
+BROWSER_CRASH = 'browser_crash'
+
+TRANSIENT_KINDS = {TIMEOUT, NAVIGATION, EMPTY_CONTENT, UNKNOWN}
+
+AUTH_MARKERS = ('digilocker', 'signinv2', 'signin', 'redirected to authentication')
+
+logger = logging.getLogger(__name__)
+
+retries = metrics.counter("retries_total", "Scheme pages retried, by the kind of error")
+
+def classify_error(message):
+    """
+    Classify an error message from a failed scheme scrape
+    """
+    text = str(message).lower()
+    if any(marker in text for marker in AUTH_MARKERS):
+        return AUTH_REDIRECT
+    if 'timeout' in text or 'timed out' in text:
+        return TIMEOUT
+    if ('net::err' in text or 'navigation' in text or 'target closed' in text or 'connection' in text
+            or 'server error' in text or 'client error' in text or 'ns_error' in text):
+        return NAVIGATION
+    return UNKNOWN
+
+def classify_details(details):
+    """
+    Return the error kind for a scraped details dict, or None if it succeeded
+    """
+    values = [str(value) for value in details.values()]
+    for value in values:
+        if value.startswith(ERROR_PREFIX):
+            return classify_error(value[len(ERROR_PREFIX):])
+    if all(value == NOT_FOUND for value in values):
+        return EMPTY_CONTENT
+    return None
+
+def backoff_delay(attempt, base=2.0, cap=60.0):
+    """
+    Full-jitter exponential backoff: a random delay up to base * 2^attempt, capped
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+async def scrape_with_retries(scrape, scheme_title="Unknown", max_attempts=3, base_delay=2.0):
+    """
+    Call `scrape()` (a coroutine function returning a details dict) until it succeeds,
+    the error isn't transient, or attempts run out.
+    Returns (details, error_kind, attempts); error_kind is None on success.
+    """
+    for attempt in range(1, max_attempts + 1):
+        details = await scrape()
+        kind = classify_details(details)
+        if kind is None:
+            return details, None, attempt
+        if kind not in TRANSIENT_KINDS or attempt == max_attempts:
+            return details, kind, attempt
+
+        delay = backoff_delay(attempt - 1, base_delay)
+        retries.inc(kind=kind)
+        logger.info("Retrying scheme", extra={
+            "scheme": scheme_title, "kind": kind, "delay": round(delay, 1), "attempt": attempt + 1, "max_attempts": max_attempts
+        })
+        await asyncio.sleep(delay)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dead_letters (
+    link TEXT PRIMARY KEY,
+    scheme TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL,
+    failed_at REAL NOT NULL
+);
+"""
+
+class DeadLetterQueue:
+    """
+    Persistent store of schemes that still failed after their retries, by canonical link.
+    The next run retries them first; a scheme leaves the queue once it succeeds.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def add(self, scheme, kind, error, attempts):
+        with self.conn:
+            self.conn.execute(
+                """INSERT INTO dead_letters (link, scheme, kind, error, attempts, failed_at)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(link) DO UPDATE SET
+                       scheme = excluded.scheme,
+                       kind = excluded.kind,
+                       error = excluded.error,
+                       attempts = dead_letters.attempts + excluded.attempts,
+                       failed_at = excluded.failed_at""",
+                (canonical_url(scheme['link']), json.dumps(scheme, ensure_ascii=False), kind, str(error), attempts, time.time())
+            )
+
+    def schemes(self):
+        """
+        Return every dead-lettered scheme, oldest failure first. They stay in the queue
+        until remove(), so a run that crashes while retrying them loses none.
+        """
+        rows = self.conn.execute("SELECT scheme FROM dead_letters ORDER BY failed_at").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def remove(self, links):
+        """
+        Drop the schemes that have now succeeded
+        """
+        with self.conn:
+            self.conn.executemany("DELETE FROM dead_letters WHERE link = ?", [(canonical_url(link),) for link in links])
+
+    def counts(self):
+        """
+        Number of dead-lettered schemes per error kind
+        """
+        return dict(self.conn.execute("SELECT kind, COUNT(*) FROM dead_letters GROUP BY kind").fetchall())
@@ -0,0 +1,438 @@
+import logging
+import re
+import time
+
+from metrics import metrics
+from page_loading import goto_scheme_page
+
+try:
+    import lxml.html
+except ImportError:  # only needed for parsing pages outside the browser
+    lxml = None
+
+BASE_URL = "https://www.myscheme.gov.in"
+
+# Sections scraped from every scheme page, in output order
+SECTIONS = {
+    "details": "Details",
+    "objective": "Objective",
+    "benefits": "Benefits",
+    "eligibility": "Eligibility",
+    "exclusions": "Exclusions",
+    "application_process": "Application Process",
+    "documents_required": "Documents Required",
+    "frequently_asked_questions": "Frequently Asked Questions",
+    "sources_and_references": "Sources And References"
+}
+
+NOT_FOUND = "Section not found"
+ERROR_PREFIX = "Error loading page:"
+
+# Which candidate won each section, indexed by the ranks below
+STRATEGIES = ["exact_h2", "exact_h3", "exact_h4", "contains_h2", "contains_h3", "contains_h4", "exact_any", "innermost"]
+
+logger = logging.getLogger(__name__)
+
+extract_seconds = metrics.histogram("extract_seconds", "Time to extract every section of a scheme page")
+dom_walk_seconds = metrics.histogram("dom_walk_seconds", "Time of the single DOM walk that finds every heading")
+section_seconds = metrics.histogram("section_seconds", "Time to resolve one section once the headings are known")
+section_strategy = metrics.counter("section_strategy_total", "Heading strategy that produced each section")
+listing_selector = metrics.counter("listing_selector_total", "Card selector that matched on each listing page")
+
+# Walks the DOM once and resolves every section heading in the same priority
+# order the old per-selector loop used:
+#   0-2  h2/h3/h4 whose text is exactly the heading
+#   3-5  h2/h3/h4 whose text contains the heading
+#   6    any element whose text is exactly the heading
+#   7    the innermost element containing the heading
+# For each section the best ranked heading with non-empty content wins. Also returns
+# the winning rank and how long each step took, for the metrics.
+EXTRACT_SECTIONS_JS = """
+({sections, base}) => {
+    const started = performance.now();
+    const norm = s => (s || '').replace(/\\s+/g, ' ').trim();
+    // Python's str.strip(), which keeps the zero-width no-break spaces the site uses
+    const strip = s => (s || '').replace(/^[^\\S\\ufeff]+|[^\\S\\ufeff]+$/g, '');
+    const skip = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE']);
+    const headingRank = {H2: 0, H3: 1, H4: 2};
+    const wanted = sections.map(([key, heading]) => [key, heading, heading.toLowerCase()]);
+
+    // candidates[key][rank] = first element (in document order) for that rank
+    const candidates = {};
+    for (const [key] of wanted) candidates[key] = new Array(8).fill(null);
+
+    const root = document.body || document.documentElement;
+    const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT);
+    for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+        const parent = node.parentElement;
+        if (!parent || skip.has(parent.tagName)) continue;
+        const lower = norm(node.nodeValue).toLowerCase();
+        if (!lower) continue;
+
+        for (const [key, heading, headingLower] of wanted) {
+            if (!lower.includes(headingLower)) continue;
+            const slots = candidates[key];
+            if (!slots[7]) slots[7] = parent;
+
+            // Exact matches: climb while the element text is still just the heading
+            for (let el = parent; el && el !== root; el = el.parentElement) {
+                if (norm(el.textContent) !== heading) break;
+                const tagRank = headingRank[el.tagName];
+                if (tagRank !== undefined && !slots[tagRank]) slots[tagRank] = el;
+                if (!slots[6]) slots[6] = el;
+            }
+
+            // Partial matches: the heading element wrapping this text node
+            const wrapper = parent.closest('h2, h3, h4');
+            if (wrapper) {
+                const rank = headingRank[wrapper.tagName] + 3;
+                if (!slots[rank]) slots[rank] = wrapper;
+            }
+        }
+    }
+
+    const nextWithText = el => {
+        let next = el.nextElementSibling;
+        while (next && (!next.textContent || next.textContent.trim() === '')) {
+            next = next.nextElementSibling;
+        }
+        return next;
+    };
+
+    const followingText = el => {
+        let content = '';
+        for (let next = el.nextSibling; next; next = next.nextSibling) {
+            content += next.textContent || '';
+        }
+        return content;
+    };
+
+    const sourcesFrom = container => {
+        const items = [];
+        for (const link of container.querySelectorAll('a')) {
+            const text = strip(link.textContent);
+            if (!text) continue;
+            let href = link.getAttribute('href');
+            if (href) {
+                if (href.startsWith('/')) href = base + href;
+                items.push(`${text}: ${href}`);
+            } else {
+                items.push(text);
+            }
+        }
+        return items.join('\\n');
+    };
+
+    const walkMs = performance.now() - started;
+    const result = {};
+    const strategies = {};
+    const timings = {};
+    for (const [key] of wanted) {
+        const sectionStarted = performance.now();
+        result[key] = null;
+        strategies[key] = -1;
+        for (let rank = 0; rank < 8; rank++) {
+            const el = candidates[key][rank];
+            if (!el) continue;
+            const next = nextWithText(el);
+            let content = '';
+            if (key === 'sources_and_references') {
+                if (next) content = sourcesFrom(next) || next.textContent;
+            } else {
+                content = next ? next.textContent : followingText(el);
+            }
+            if (strip(content)) {
+                result[key] = content;
+                strategies[key] = rank;
+                break;
+            }
+        }
+        timings[key] = performance.now() - sectionStarted;
+    }
+    return {sections: result, strategies, timings, walkMs};
+}
+"""
+
+# Selectors tried in order to find scheme cards on a listing page
+CARD_SELECTORS = [
+    'a[href*="/schemes/"]',  # More specific selector
+    'a[href*="scheme"]',
+    '[data-testid*="scheme"]'
+]
+
+CARD_DESCRIPTION_SELECTOR = 'p, div[class*="desc"], div[class*="summary"], .text-gray-600'
+
+# Reads every card on a listing page in one call: the link's href and text (or its
+# parent's text when the link is empty), the first description-like element in the
+# card's grandparent, and any tag/badge labels in the card
+EXTRACT_CARDS_JS = """
+({selectors, descriptionSelector}) => {
+    let selector = null;
+    let elements = [];
+    for (const candidate of selectors) {
+        elements = Array.from(document.querySelectorAll(candidate));
+        if (elements.length) {
+            selector = candidate;
+            break;
+        }
+    }
+
+    const cards = [];
+    for (const el of elements) {
+        const link = el.getAttribute('href');
+        if (!link) continue;
+
+        let title = el.textContent;
+        if ((!title || title.trim() === '') && el.parentElement) {
+            title = el.parentElement.textContent;
+        }
+
+        let description = null;
+        const tags = [];
+        const container = el.parentElement && el.parentElement.parentElement;
+        if (container) {
+            const desc = container.querySelector(descriptionSelector);
+            if (desc) description = desc.textContent;
+            for (const tag of container.querySelectorAll('[class*="tag"], [class*="badge"], [class*="chip"]')) {
+                const text = (tag.textContent || '').trim();
+                if (text && !tags.includes(text)) tags.push(text);
+            }
+        }
+        cards.push({title, link, description, tags});
+    }
+
+    const schemeLikeLinks = [];
+    if (!selector) {
+        for (const a of Array.from(document.querySelectorAll('a')).slice(0, 20)) {
+            const href = a.getAttribute('href');
+            if (href && href.toLowerCase().includes('scheme')) schemeLikeLinks.push(href);
+        }
+    }
+
+    return {
+        pageTitle: document.title,
+        url: location.href,
+        selector,
+        cards,
+        totalLinks: document.querySelectorAll('a').length,
+        schemeLikeLinks
+    };
+}
+"""
+
+_JS_WHITESPACE = re.compile(r"[\s\ufeff]+")
+_JS_TRIM = re.compile(r"^[\s\ufeff]+|[\s\ufeff]+$")
+_SKIP_TAGS = {"script", "style", "noscript", "template"}
+_HEADING_RANK = {"h2": 0, "h3": 1, "h4": 2}
+
+def _norm(text):
+    return _JS_WHITESPACE.sub(" ", text or "").strip(" ")
+
+def _text_content(node):
+    # DOM textContent: comments report their own data, elements all descendant text
+    if not isinstance(node.tag, str):
+        return node.text or ""
+    return node.text_content()
+
+def _iter_text_nodes(root):
+    """
+    Yield (text, parent element) for every text node under root in document order
+    """
+    stack = [root]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, tuple):
+            yield item
+            continue
+        if not isinstance(item.tag, str):
+            continue
+        if item.text:
+            yield item.text, item
+        # Push children in reverse so they pop in order, each followed by its tail
+        for child in reversed(item):
+            if child.tail:
+                stack.append((child.tail, item))
+            stack.append(child)
+
+def _next_element_with_text(el):
+    nxt = el.getnext()
+    while nxt is not None and (not isinstance(nxt.tag, str) or not _JS_TRIM.sub("", nxt.text_content())):
+        nxt = nxt.getnext()
+    return nxt
+
+def _following_text(el):
+    content = el.tail or ""
+    for sibling in el.itersiblings():
+        content += _text_content(sibling) + (sibling.tail or "")
+    return content
+
+def _sources_from(container):
+    items = []
+    for link in container.iterdescendants("a"):
+        text = link.text_content().strip()
+        if not text:
+            continue
+        href = link.get("href")
+        if href:
+            if href.startswith("/"):
+                href = BASE_URL + href
+            items.append(f"{text}: {href}")
+        else:
+            items.append(text)
+    return "\n".join(items)
+
+def extract_sections_from_html(html):
+    """
+    Extract every section from a scheme page's HTML without a browser.
+    Mirrors EXTRACT_SECTIONS_JS so both paths produce the same details dict.
+    """
+    if lxml is None:
+        raise ImportError("lxml is required to parse scheme pages outside the browser (pip install lxml)")
+
+    started = time.perf_counter()
+    document = lxml.html.document_fromstring(html)
+    root = document.find("body")
+    if root is None:
+        root = document
+
+    wanted = [(key, heading, heading.lower()) for key, heading in SECTIONS.items()]
+    candidates = {key: [None] * 8 for key in SECTIONS}
+
+    for text, parent in _iter_text_nodes(root):
+        if parent.tag in _SKIP_TAGS:
+            continue
+        lower = _norm(text).lower()
+        if not lower:
+            continue
+
+        for key, heading, heading_lower in wanted:
+            if heading_lower not in lower:
+                continue
+            slots = candidates[key]
+            if slots[7] is None:
+                slots[7] = parent
+
+            # Exact matches: climb while the element text is still just the heading
+            el = parent
+            while el is not None and el is not root:
+                if _norm(el.text_content()) != heading:
+                    break
+                rank = _HEADING_RANK.get(el.tag)
+                if rank is not None and slots[rank] is None:
+                    slots[rank] = el
+                if slots[6] is None:
+                    slots[6] = el
+                el = el.getparent()
+
+            # Partial matches: the heading element wrapping this text node
+            wrapper = parent
+            while wrapper is not None and wrapper.tag not in _HEADING_RANK:
+                wrapper = wrapper.getparent()
+            if wrapper is not None:
+                rank = _HEADING_RANK[wrapper.tag] + 3
+                if slots[rank] is None:
+                    slots[rank] = wrapper
+
+    walked = time.perf_counter()
+    dom_walk_seconds.observe(walked - started, source="html")
+
+    details = {}
+    for key in SECTIONS:
+        section_started = time.perf_counter()
+        details[key] = NOT_FOUND
+        strategy = "not_found"
+        for rank, el in enumerate(candidates[key]):
+            if el is None:
+                continue
+            nxt = _next_element_with_text(el)
+            content = ""
+            if key == "sources_and_references":
+                if nxt is not None:
+                    content = _sources_from(nxt) or nxt.text_content()
+            else:
+                content = nxt.text_content() if nxt is not None else _following_text(el)
+            if content.strip():
+                details[key] = content.strip()
+                strategy = STRATEGIES[rank]
+                break
+        section_strategy.inc(section=key, strategy=strategy, source="html")
+        section_seconds.observe(time.perf_counter() - section_started, section=key, source="html")
+
+    extract_seconds.observe(time.perf_counter() - started, source="html")
+    return details
+
+def has_content(details):
+    """
+    True when at least one section was found on the page
+    """
+    return any(value != NOT_FOUND and not value.startswith(ERROR_PREFIX) for value in details.values())
+
+def error_details(error):
+    """
+    Build the details dict recorded for a scheme whose page could not be loaded
+    """
+    return {key: f"{ERROR_PREFIX} {error}" for key in SECTIONS}
+
+async def extract_sections(page):
+    """
+    Extract every section from the currently loaded scheme page in one evaluate call
+    """
+    with extract_seconds.time(source="browser"):
+        raw = await page.evaluate(EXTRACT_SECTIONS_JS, {
+            "sections": list(SECTIONS.items()),
+            "base": BASE_URL
+        })
+
+    dom_walk_seconds.observe(raw["walkMs"] / 1000, source="browser")
+    for key in SECTIONS:
+        rank = raw["strategies"].get(key, -1)
+        section_strategy.inc(section=key, strategy=STRATEGIES[rank] if rank >= 0 else "not_found", source="browser")
+        section_seconds.observe(raw["timings"].get(key, 0) / 1000, section=key, source="browser")
+    sections = raw["sections"]
+    return {key: (sections.get(key) or "").strip() or NOT_FOUND for key in SECTIONS}
+
+async def extract_listing_cards(page):
+    """
+    Read every scheme card on the current listing page in one evaluate call
+    """
+    listing = await page.evaluate(EXTRACT_CARDS_JS, {
+        "selectors": CARD_SELECTORS,
+        "descriptionSelector": CARD_DESCRIPTION_SELECTOR
+    })
+    listing_selector.inc(selector=listing["selector"] or "none")
+    return listing
+
+def card_to_scheme(card, page_number):
+    """
+    Clean a raw listing card into the scheme record format used across the project
+    """
+    title = card.get('title')
+    description = card.get('description')
+    link = card['link']
+    scheme_info = {
+        'title': title.strip() if title else "No title found",
+        'description': description.strip()[:200] if description else "No description found",
+        'link': link if link.startswith('http') else f"{BASE_URL}{link}",
+        'page_found': page_number
+    }
+    if card.get('tags'):
+        scheme_info['tags'] = card['tags']
+    return scheme_info
+
+async def scrape_scheme_details(page, full_link, scheme_title="Unknown", rate_limiter=None):
+    """
+    Scrape detailed information from a scheme's individual page.
+    With a rate limiter, the request waits for the host's budget and reports back how it went.
+    """
+    try:
+        logger.debug("Extracting details", extra={"scheme": scheme_title, "url": full_link})
+        await goto_scheme_page(page, full_link, SECTIONS.values(), timeout=30000, rate_limiter=rate_limiter)
+        if any(marker in page.url.lower() for marker in ('digilocker', 'signinv2', 'signin')):
+            raise RuntimeError(f"Redirected to authentication page: {page.url}")
+        details = await extract_sections(page)
+
+    except Exception as e:
+        logger.warning("Error loading details", extra={"scheme": scheme_title, "url": full_link, "error": str(e)})
+        details = error_details(e)
+
+    return details
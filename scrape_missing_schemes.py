@@ -1,248 +1,115 @@
 import asyncio
 import json
+import logging
 import os
-from playwright.async_api import async_playwright
-
-async def scrape_scheme_details(page, full_link, scheme_title="Unknown"):
-    """
-    Scrape detailed information from a scheme's individual page
-    This function is copied from your complete_scraper.py with full logic
-    """
-    details = {}
-    
-    try:
-        print(f"  📄 Extracting details from: {scheme_title}")
-        await page.goto(full_link, wait_until='networkidle', timeout=30000)
-        
-        # Define sections to scrape
-        sections = {
-            "details": "Details",
-            "objective": "Objective", 
-            "benefits": "Benefits",
-            "eligibility": "Eligibility",
-            "exclusions": "Exclusions",
-            "application_process": "Application Process",
-            "documents_required": "Documents Required",
-            "frequently_asked_questions": "Frequently Asked Questions",
-            "sources_and_references": "Sources And References"
-        }
-        
-        # Try multiple selector strategies for each section
-        for key, heading in sections.items():
-            section_content = ""
-            
-            # Strategy 1: Look for exact heading match
-            selectors_to_try = [
-                f'h2:text-is("{heading}")',
-                f'h3:text-is("{heading}")',
-                f'h4:text-is("{heading}")',
-                f'h2:has-text("{heading}")',
-                f'h3:has-text("{heading}")',
-                f'h4:has-text("{heading}")',
-                f'*:text-is("{heading}")',
-                f'*:has-text("{heading}")'
-            ]
-            
-            content_found = False
-            
-            for selector in selectors_to_try:
-                try:
-                    heading_element = await page.query_selector(selector)
-                    if heading_element:
-                        
-                        # Special handling for Sources And References
-                        if key == "sources_and_references":
-                            # Look for the container after the heading
-                            next_container = await heading_element.evaluate_handle("""
-                                el => {
-                                    let next = el.nextElementSibling;
-                                    // Find the next container that has content
-                                    while (next && (!next.textContent || next.textContent.trim() === '')) {
-                                        next = next.nextElementSibling;
-                                    }
-                                    return next;
-                                }
-                            """)
-                            
-                            if next_container:
-                                # Look for links within this container
-                                links = await next_container.query_selector_all('a')
-                                if links:
-                                    sources_list = []
-                                    for link in links:
-                                        link_text = await link.text_content()
-                                        link_href = await link.get_attribute('href')
-                                        if link_text and link_text.strip():
-                                            if link_href:
-                                                # Make sure href is absolute
-                                                if link_href.startswith('/'):
-                                                    link_href = f"https://www.myscheme.gov.in{link_href}"
-                                                sources_list.append(f"{link_text.strip()}: {link_href}")
-                                            else:
-                                                sources_list.append(link_text.strip())
-                                    section_content = "\n".join(sources_list) if sources_list else ""
-                                
-                                # If no links found, get all text
-                                if not section_content:
-                                    section_content = await next_container.text_content()
-                        else:
-                            # Regular content extraction for other sections
-                            # Try to get content from next sibling or parent container
-                            next_element = await heading_element.evaluate_handle("""
-                                el => {
-                                    let next = el.nextElementSibling;
-                                    // Skip empty elements
-                                    while (next && (!next.textContent || next.textContent.trim() === '')) {
-                                        next = next.nextElementSibling;
-                                    }
-                                    return next;
-                                }
-                            """)
-                            
-                            if next_element:
-                                section_content = await next_element.text_content()
-                            else:
-                                # Try to find content in parent container
-                                parent = await heading_element.query_selector('xpath=..')
-                                if parent:
-                                    # Get all text after the heading within the parent
-                                    section_content = await parent.evaluate(f"""
-                                        el => {{
-                                            const heading = el.querySelector('*[textContent*="{heading}"]') || el.querySelector('*:has-text("{heading}")');
-                                            if (heading) {{
-                                                let content = '';
-                                                let next = heading.nextSibling;
-                                                while (next) {{
-                                                    if (next.nodeType === Node.TEXT_NODE) {{
-                                                        content += next.textContent;
-                                                    }} else if (next.nodeType === Node.ELEMENT_NODE) {{
-                                                        content += next.textContent;
-                                                    }}
-                                                    next = next.nextSibling;
-                                                }}
-                                                return content;
-                                            }}
-                                            return '';
-                                        }}
-                                    """)
-                        
-                        if section_content and section_content.strip():
-                            details[key] = section_content.strip()
-                            content_found = True
-                            break
-                            
-                except Exception as e:
-                    continue
-            
-            if not content_found:
-                details[key] = "Section not found"
-        
-    except Exception as e:
-        print(f"    ❌ Error loading details for {scheme_title}: {e}")
-        # Add error info to all sections
-        error_sections = {
-            "details": "Details",
-            "objective": "Objective", 
-            "benefits": "Benefits",
-            "eligibility": "Eligibility",
-            "exclusions": "Exclusions",
-            "application_process": "Application Process",
-            "documents_required": "Documents Required",
-            "frequently_asked_questions": "Frequently Asked Questions",
-            "sources_and_references": "Sources And References"
-        }
-        for key in error_sections.keys():
-            details[key] = f"Error loading page: {e}"
-    
-    return details
+from crawl_engine import CrawlConfig, run_crawl
+from jsonl_writer import iter_records
+from reconcile import reconcile
+from record_store import RecordStore
+from structured_logging import configure_logging
 
-async def main():
-    missing_schemes_file = r"E:\Capital\scraping\missing_schemes.json"
-    details_file = r"E:\Capital\scraping\details_cleaned.json"
-    failed_schemes_file = r"E:\Capital\scraping\failed_missing_schemes.json"
+logger = logging.getLogger(__name__)
 
-    # Load the list of missing schemes
-    try:
-        with open(missing_schemes_file, 'r', encoding='utf-8') as f:
-            schemes_to_scrape = json.load(f)
-        print(f"✅ Found {len(schemes_to_scrape)} missing schemes to scrape.")
-    except FileNotFoundError:
-        print(f"❌ Error: '{missing_schemes_file}' not found. Run the comparison script first.")
-        return
-    except json.JSONDecodeError:
-        print(f"❌ Error: Could not decode JSON from '{missing_schemes_file}'.")
-        return
+# Block images, fonts, media and third-party trackers on every page we open
+BLOCK_RESOURCES = False
 
-    # Load existing schemes to avoid duplicates and to append to
-    try:
-        with open(details_file, 'r', encoding='utf-8') as f:
-            existing_details = json.load(f)
-        print(f"✅ Loaded {len(existing_details)} existing schemes from '{details_file}'.")
-    except (FileNotFoundError, json.JSONDecodeError):
-        print(f"⚠️ Warning: Could not load '{details_file}'. A new file will be created with only the newly scraped schemes.")
-        existing_details = []
+# Transient failures are retried in the same run; schemes that still fail are
+# dead-lettered and picked up first by the next run
+MAX_ATTEMPTS = 3
+DEAD_LETTER_FILE = r"E:\Capital\scraping\dead_letters.db"
 
-    newly_scraped_schemes = []
-    failed_schemes = []
+# Number of scheme pages scraped in parallel; the shared rate limiter keeps this polite
+DETAIL_CONCURRENCY = 4
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        page = await browser.new_page()
+# Also scrape schemes that were scraped before but are no longer listed, to see whether
+# their pages still exist
+RECHECK_ORPHANED = True
 
-        for i, scheme in enumerate(schemes_to_scrape):
-            print(f"\n{'='*60}")
-            print(f"🔍 PROCESSING {i+1}/{len(schemes_to_scrape)}: {scheme.get('title', 'Unknown')}")
-            print(f"{'='*60}")
+# Scraped records keyed by canonical link; each new or refreshed scheme is one upsert
+RECORD_STORE_FILE = r"E:\Capital\scraping\details.db"
 
-            try:
-                details = await scrape_scheme_details(page, scheme['link'], scheme['title'])
-                
-                if any("Error loading page:" in str(v) for v in details.values()):
-                    print(f"  ❌ Failed to extract details for {scheme['title']}")
-                    failed_schemes.append(scheme)
-                else:
-                    # Combine original info with scraped details
-                    detailed_scheme = {
-                        "title": scheme.get('title'),
-                        "description": "No description found",
-                        "link": scheme.get('link'),
-                        **details
-                    }
-                    newly_scraped_schemes.append(detailed_scheme)
-                    print(f"  ✅ Successfully extracted details for {scheme['title']}")
-
-                await asyncio.sleep(1)  # Small delay between requests
+# Rewrite details_cleaned.json, sorted by title, from the store after each run.
+# Any time later: python record_store.py <store> --export details_cleaned.json
+EXPORT_JSON = True
 
-            except Exception as e:
-                print(f"  ❌ An unexpected error occurred while processing {scheme['title']}: {e}")
-                failed_schemes.append(scheme)
-                continue
+def build_record(scheme, details):
+    # Combine original info with scraped details
+    return {
+        "title": scheme.get('title'),
+        "description": scheme.get('description') or "No description found",
+        "link": scheme.get('link'),
+        **details
+    }
 
-        await browser.close()
+async def main():
+    listing_file = r"E:\Capital\scraping\cleaned_schemes_data.json"
+    details_file = r"E:\Capital\scraping\details_cleaned.json"
+    failed_schemes_file = r"E:\Capital\scraping\failed_missing_schemes.json"
+    scraped_jsonl_file = r"E:\Capital\scraping\missing_details.jsonl"
 
-    if newly_scraped_schemes:
-        updated_details = existing_details + newly_scraped_schemes
-        print(f"\n✅ Added {len(newly_scraped_schemes)} new schemes.")
-        print(f"📈 Total schemes now: {len(updated_details)}")
+    # The store is seeded from the JSON file once; after that the store is the source
+    with RecordStore(RECORD_STORE_FILE) as store:
+        if not len(store) and os.path.exists(details_file):
+            try:
+                store.upsert_many(iter_records(details_file))
+                logger.info("Imported existing schemes", extra={"schemes": len(store), "path": details_file})
+            except json.JSONDecodeError:
+                logger.warning("Could not decode the details file, starting from an empty store", extra={"path": details_file})
 
+        # Compare the listing with the stored details: missing, stale and orphaned schemes
+        # all go straight to the crawl
         try:
-            # Sort the final list alphabetically by title for consistency
-            updated_details.sort(key=lambda x: x.get('title', ''))
-            with open(details_file, 'w', encoding='utf-8') as f:
-                json.dump(updated_details, f, indent=2, ensure_ascii=False)
-            print(f"💾 Successfully updated '{details_file}'")
-        except Exception as e:
-            print(f"❌ Error saving updated data to '{details_file}': {e}")
+            result = reconcile(iter_records(listing_file), store.records())
+        except FileNotFoundError:
+            logger.error("Listing file not found, collect the listing first", extra={"path": listing_file})
+            return
+        except json.JSONDecodeError as e:
+            logger.error("Could not decode the listing file", extra={"path": listing_file, "error": str(e)})
+            return
+    schemes_to_scrape = result['missing'] + result['stale'] + (result['orphaned'] if RECHECK_ORPHANED else [])
+    logger.info("Reconciled the listing with the stored details", extra={
+        "missing": len(result['missing']), "stale": len(result['stale']), "orphaned": len(result['orphaned'])
+    })
+    if not schemes_to_scrape:
+        logger.info("The scraped details match the listing, nothing to do")
+        return
+
+    # Every scraped scheme is upserted into the store as it finishes, replacing its old record.
+    # Dead-lettered schemes from the last run are retried first by the engine
+    summary = await run_crawl(CrawlConfig(
+        schemes=schemes_to_scrape,
+        concurrency=DETAIL_CONCURRENCY,
+        block_resources=BLOCK_RESOURCES,
+        jsonl_file=scraped_jsonl_file,
+        append=False,
+        max_attempts=MAX_ATTEMPTS,
+        dead_letter_file=DEAD_LETTER_FILE,
+        record_store_file=RECORD_STORE_FILE,
+        build_record=build_record
+    ))
+    failed_schemes = summary['failed']
+
+    if summary['done']:
+        logger.info("Added or refreshed schemes", extra={"schemes": summary['done']})
+        if EXPORT_JSON:
+            try:
+                # Sorted alphabetically by title for consistency
+                with RecordStore(RECORD_STORE_FILE) as store:
+                    total = store.export_json(details_file)
+                logger.info("Details file updated", extra={"path": details_file, "total": total})
+            except Exception as e:
+                logger.error("Error saving updated data", extra={"path": details_file, "error": str(e)})
 
     if failed_schemes:
-        print(f"\n❌ {len(failed_schemes)} schemes failed to scrape.")
+        logger.warning("Schemes failed to scrape", extra={"schemes": len(failed_schemes)})
         try:
             with open(failed_schemes_file, 'w', encoding='utf-8') as f:
                 json.dump(failed_schemes, f, indent=2, ensure_ascii=False)
-            print(f"📋 Failed schemes list saved to '{failed_schemes_file}'")
+            logger.info("Failed schemes saved", extra={"path": failed_schemes_file})
         except Exception as e:
-            print(f"❌ Error saving failed schemes list: {e}")
+            logger.error("Error saving failed schemes list", extra={"error": str(e)})
 
 if __name__ == "__main__":
+    configure_logging()
     asyncio.run(main())
 
@@ -4,7 +4,7 @@ from playwright.async_api import async_playwright
 
 async def scrape():
     async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)  # Set to False to see browser
+        browser = await p.chromium.launch(headless=True)  # Set to False to see browser
         page = await browser.new_page()
         
         # Go to the agriculture schemes page
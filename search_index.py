@@ -0,0 +1,200 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+
+from dedup import canonical_url
+from scheme_extractor import NOT_FOUND
+
+logger = logging.getLogger(__name__)
+
+# Indexed fields: (column, record key, boost). Matches in the title count ten
+# times as much as the same match in the FAQ.
+FIELDS = (
+    ("title", "title", 10.0),
+    ("description", "description", 4.0),
+    ("details", "details", 2.0),
+    ("benefits", "benefits", 3.0),
+    ("eligibility", "eligibility", 3.0),
+    ("faq", "frequently_asked_questions", 1.0),
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    link TEXT NOT NULL UNIQUE,
+    content_hash TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS schemes_fts USING fts5(
+    {', '.join(column for column, _, _ in FIELDS)},
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+"""
+
+def _field_text(record, key):
+    value = record.get(key)
+    if not value or value == NOT_FOUND or str(value).startswith('Error'):
+        return ""
+    return str(value)
+
+def _match_expression(query):
+    # Plain keywords: every word must match, FTS5 operators in the text are taken literally
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+class SearchIndex:
+    """
+    Persistent full-text index of scheme records in SQLite FTS5, ranked by bm25 with
+    per-field boosts (FIELDS). Records are keyed by canonical link; upserting one
+    re-indexes it only when its indexed text changed, so the index can follow a crawl
+    record by record. Writes are committed every `commit_every` changes and on close.
+
+        with SearchIndex('schemes_search.db') as index:
+            index.search('organic farming subsidy', limit=5)
+    """
+
+    def __init__(self, path, commit_every=200):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.commit_every = commit_every
+        self._uncommitted = 0
+        self._rank = "bm25(schemes_fts, " + ", ".join(str(boost) for _, _, boost in FIELDS) + ")"
+
+    def upsert(self, record):
+        """
+        Index a record, replacing its previous version.
+        Returns False when the indexed text hasn't changed.
+        """
+        link = canonical_url(record['link'])
+        values = [_field_text(record, key) for _, key, _ in FIELDS]
+        content_hash = hashlib.sha256(json.dumps(values, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+        row = self.conn.execute("SELECT id, content_hash FROM documents WHERE link = ?", (link,)).fetchone()
+        if row and row[1] == content_hash:
+            return False
+        if row:
+            doc_id = row[0]
+            self.conn.execute("DELETE FROM schemes_fts WHERE rowid = ?", (doc_id,))
+            self.conn.execute("UPDATE documents SET content_hash = ?, updated_at = ? WHERE id = ?",
+                              (content_hash, time.time(), doc_id))
+        else:
+            doc_id = self.conn.execute(
+                "INSERT INTO documents (link, content_hash, updated_at) VALUES (?, ?, ?)", (link, content_hash, time.time())
+            ).lastrowid
+        placeholders = ", ".join("?" for _ in FIELDS)
+        self.conn.execute(
+            f"INSERT INTO schemes_fts (rowid, {', '.join(column for column, _, _ in FIELDS)}) VALUES (?, {placeholders})",
+            (doc_id, *values)
+        )
+
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+        return True
+
+    def delete(self, link):
+        link = canonical_url(link)
+        row = self.conn.execute("SELECT id FROM documents WHERE link = ?", (link,)).fetchone()
+        if row:
+            self.conn.execute("DELETE FROM schemes_fts WHERE rowid = ?", (row[0],))
+            self.conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+            self._uncommitted += 1
+
+    def search(self, query, limit=10, raw=False):
+        """
+        Return the best matching schemes as dicts of link, title, score and a snippet
+        of the best matching field, best first. With `raw`, the query is passed to
+        FTS5 as is, for phrases, OR, NEAR, prefixes* and column filters (eligibility: farmer).
+        """
+        expression = query if raw else _match_expression(query)
+        if not expression:
+            return []
+        rows = self.conn.execute(
+            f"""
+            SELECT documents.link, schemes_fts.title, {self._rank} AS score,
+                   snippet(schemes_fts, -1, '[', ']', '…', 16)
+            FROM schemes_fts JOIN documents ON documents.id = schemes_fts.rowid
+            WHERE schemes_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+            """,
+            (expression, limit)
+        )
+        # bm25 is negative, more negative is better
+        return [{"link": link, "title": title, "score": round(-score, 3), "snippet": snippet}
+                for link, title, score, snippet in rows]
+
+    def optimize(self):
+        """
+        Merge the index segments left by many small updates, for the fastest queries
+        """
+        self.commit()
+        with self.conn:
+            self.conn.execute("INSERT INTO schemes_fts (schemes_fts) VALUES ('optimize')")
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def commit(self):
+        self.conn.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def index_records(index, records):
+    """
+    Upsert every record. Returns (records seen, records (re)indexed).
+    """
+    seen = changed = 0
+    for record in records:
+        if not record.get('link') or record['link'] == "No link found":
+            continue
+        seen += 1
+        changed += index.upsert(record)
+    return seen, changed
+
+if __name__ == "__main__":
+    import argparse
+
+    from jsonl_writer import iter_records
+    from structured_logging import configure_logging
+
+    parser = argparse.ArgumentParser(description="Full-text search over scraped scheme records")
+    parser.add_argument("--index", default="schemes_search.db", help="SQLite index file (default: schemes_search.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("index", help="add or update records from a crawl output")
+    build.add_argument("src", help="JSON array or JSONL of scheme records")
+    query = commands.add_parser("query", help="search the index")
+    query.add_argument("query")
+    query.add_argument("--limit", type=int, default=10)
+    query.add_argument("--raw", action="store_true", help="use FTS5 query syntax")
+    args = parser.parse_args()
+    configure_logging()
+
+    with SearchIndex(args.index) as index:
+        started = time.perf_counter()
+        if args.command == "index":
+            seen, changed = index_records(index, iter_records(args.src))
+            index.optimize()
+            logger.info("Indexed records", extra={
+                "changed": changed, "records": seen, "indexed": len(index), "path": args.index,
+                "seconds": round(time.perf_counter() - started, 1)
+            })
+        else:
+            results = index.search(args.query, args.limit, args.raw)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            for n, result in enumerate(results, 1):
+                print(f"{n}. {result['title']} ({result['score']})\n   {result['link']}\n   {result['snippet']}")
+            logger.info("Search finished", extra={"results": len(results), "ms": round(elapsed_ms, 1)})
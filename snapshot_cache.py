@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from jsonl_writer import JsonlWriter, jsonl_to_json
+from scheme_extractor import extract_sections_from_html, has_content
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    url TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    content_hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    scheme TEXT,
+    PRIMARY KEY (url, fetched_at)
+);
+CREATE INDEX IF NOT EXISTS snapshots_by_hash ON snapshots (content_hash);
+"""
+
+class SnapshotCache:
+    """
+    On-disk cache of the raw HTML of every fetched page.
+
+    Each distinct page body is stored once, gzip-compressed, under its sha256
+    (objects/ab/abcdef....html.gz), so refetching an unchanged page costs no space.
+    An SQLite index maps (url, fetched_at) to the content hash, along with the
+    listing fields of the scheme, so records can be rebuilt from the cache alone.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, 'index.db'))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def object_path(self, content_hash):
+        return os.path.join(self.root, 'objects', content_hash[:2], content_hash + '.html.gz')
+
+    def write_object(self, html):
+        """
+        Store a page body and return its content hash. Touches only files, so it
+        can run in a worker thread while the index stays on the caller's thread.
+        """
+        data = html.encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self.object_path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return content_hash
+
+    def record(self, url, content_hash, size, fetched_at=None, scheme=None):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO snapshots (url, fetched_at, content_hash, size, scheme) VALUES (?, ?, ?, ?, ?)",
+                (url, fetched_at or time.time(), content_hash, size,
+                 json.dumps(scheme, ensure_ascii=False) if scheme is not None else None)
+            )
+
+    def put(self, url, html, fetched_at=None, scheme=None):
+        content_hash = self.write_object(html)
+        self.record(url, content_hash, len(html), fetched_at, scheme)
+        return content_hash
+
+    def read(self, content_hash):
+        with gzip.open(self.object_path(content_hash), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def latest(self, url):
+        """
+        Return (fetched_at, content_hash) of the newest snapshot of a URL, or None
+        """
+        return self.conn.execute(
+            "SELECT fetched_at, content_hash FROM snapshots WHERE url = ? ORDER BY fetched_at DESC LIMIT 1", (url,)
+        ).fetchone()
+
+    def iter_latest(self):
+        """
+        Yield (url, fetched_at, content_hash, scheme) for the newest snapshot of every URL
+        """
+        rows = self.conn.execute(
+            "SELECT url, MAX(fetched_at), content_hash, scheme FROM snapshots GROUP BY url ORDER BY url"
+        )
+        for url, fetched_at, content_hash, scheme in rows:
+            yield url, fetched_at, content_hash, json.loads(scheme) if scheme else {'link': url}
+
+    def counts(self):
+        urls, snapshots = self.conn.execute("SELECT COUNT(DISTINCT url), COUNT(*) FROM snapshots").fetchone()
+        objects = self.conn.execute("SELECT COUNT(DISTINCT content_hash) FROM snapshots").fetchone()[0]
+        return {"urls": urls, "snapshots": snapshots, "objects": objects}
+
+def extract_from_cache(cache, jsonl_file, json_file=None):
+    """
+    Offline extraction: rebuild every record from the newest cached snapshot of each
+    page with the current parser. No browser and no network.
+    Returns (records written, pages with no content).
+    """
+    written = 0
+    empty = []
+    with JsonlWriter(jsonl_file, flush_every=100, append=False) as writer:
+        for url, fetched_at, content_hash, scheme in cache.iter_latest():
+            try:
+                details = extract_sections_from_html(cache.read(content_hash))
+            except Exception as e:
+                logger.warning("Could not read the snapshot", extra={"url": url, "error": str(e)})
+                empty.append(url)
+                continue
+            if not has_content(details):
+                empty.append(url)
+                continue
+            writer.write({**scheme, **details})
+            written += 1
+
+    if json_file:
+        jsonl_to_json(jsonl_file, json_file)
+    return written, empty
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Re-extract scheme records from cached HTML snapshots, offline")
+    parser.add_argument("cache_dir", help="snapshot cache written by a crawl with --snapshot-dir")
+    parser.add_argument("--jsonl", default="details_from_cache.jsonl", help="JSONL output (default: details_from_cache.jsonl)")
+    parser.add_argument("--json", help="pretty JSON array built from the JSONL")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    with SnapshotCache(args.cache_dir) as cache:
+        print(f"📦 Snapshot cache: {cache.counts()}")
+        written, empty = extract_from_cache(cache, args.jsonl, args.json)
+    print(f"💾 Re-extracted {written} records to '{args.json or args.jsonl}' in {time.monotonic() - started:.1f}s")
+    if empty:
+        print(f"⚠️ {len(empty)} cached pages had no sections, e.g. {empty[:3]}")
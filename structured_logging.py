@@ -0,0 +1,59 @@
+import json
+import logging
+import sys
+import time
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+def _fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRS}
+
+class KeyValueFormatter(logging.Formatter):
+    """
+    Human-readable lines with the structured fields appended as key=value
+    """
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s", "%H:%M:%S")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value!r}" if isinstance(value, str) and ' ' in value else f"{key}={value}"
+                                   for key, value in fields.items())
+        return line
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, for log shippers and jq
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "time": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update(_fields(record))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def configure_logging(level="INFO", json_output=False, stream=None):
+    """
+    Send every module's log records to one handler, as key=value lines or JSON.
+    Per-scheme progress is logged at DEBUG, so INFO keeps the hot loop quiet.
+    """
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if json_output else KeyValueFormatter())
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    # Third-party chatter about every HTTP request
+    logging.getLogger("httpx").setLevel(logging.WARNING)
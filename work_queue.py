@@ -0,0 +1,322 @@
+import json
+import logging
+import sqlite3
+import time
+import uuid
+
+from dedup import canonical_url
+
+logger = logging.getLogger(__name__)
+
+class Lease:
+    """
+    One work item handed to one worker until `expires_at`. Only the holder of the
+    current `token` can heartbeat, fail or release it.
+    """
+
+    def __init__(self, key, item, token, attempts, expires_at):
+        self.key = key
+        self.item = item
+        self.token = token
+        self.attempts = attempts
+        self.expires_at = expires_at
+
+    def __repr__(self):
+        return f"Lease({self.key!r}, attempts={self.attempts})"
+
+class WorkQueue:
+    """
+    Work shared by several crawler processes or hosts. An item is leased to one
+    worker at a time; a lease that isn't renewed with heartbeat() within the
+    visibility timeout expires and the item goes to another worker. complete() is
+    idempotent, so an item finished by two workers (after a lease expired) is
+    recorded once. Items that fail or time out `max_attempts` times are dead.
+
+    Whoever discovers the items seals the queue once it has enqueued them all. An
+    empty queue that isn't sealed only means discovery hasn't caught up yet, so
+    workers keep polling until the queue is sealed and drained.
+
+    SQLiteWorkQueue implements this for processes on one host; a network queue
+    only has to implement the same methods.
+    """
+
+    # Seconds a lease lasts without a heartbeat
+    visibility_timeout = 300.0
+
+    def enqueue(self, items):
+        """
+        Add items that aren't queued yet (done or not). Returns how many were new.
+        """
+        raise NotImplementedError
+
+    def lease(self, worker, limit=1):
+        """
+        Lease up to `limit` pending or expired items to `worker`; returns a list of Lease
+        """
+        raise NotImplementedError
+
+    def heartbeat(self, lease):
+        """
+        Extend a lease by the visibility timeout. Returns False if it was lost.
+        """
+        raise NotImplementedError
+
+    def complete(self, lease, result=None):
+        """
+        Mark the item done with its result. Returns False if it was already done.
+        """
+        raise NotImplementedError
+
+    def fail(self, lease, error):
+        """
+        Give the item back for another attempt, or mark it dead after max_attempts
+        """
+        raise NotImplementedError
+
+    def release(self, lease):
+        """
+        Give the item back unprocessed, e.g. on shutdown, without counting an attempt
+        """
+        raise NotImplementedError
+
+    def counts(self):
+        """
+        Number of items per status: pending, leased, done, dead
+        """
+        raise NotImplementedError
+
+    def seal(self):
+        """
+        Record that discovery is done and nothing more will be enqueued
+        """
+        raise NotImplementedError
+
+    def unseal(self):
+        """
+        Open the queue to a new discovery pass
+        """
+        raise NotImplementedError
+
+    def is_sealed(self):
+        raise NotImplementedError
+
+    def is_finished(self):
+        """
+        True once the queue is sealed and nothing is pending or leased any more
+        """
+        if not self.is_sealed():
+            return False
+        counts = self.counts()
+        return not counts.get('pending') and not counts.get('leased')
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    item TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    lease_token TEXT,
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (status, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def scheme_key(scheme):
+    return canonical_url(scheme['link'])
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    WorkQueue in one SQLite file, for several worker processes on the same host.
+    Leasing runs in an immediate transaction, so two processes never lease the
+    same item. Items are keyed by `key` (canonical link of a scheme by default).
+    """
+
+    def __init__(self, path, visibility_timeout=300.0, max_attempts=3, key=scheme_key):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.key = key
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _transaction(self):
+        return _Immediate(self.conn)
+
+    def enqueue(self, items):
+        now = time.time()
+        added = 0
+        with self._transaction():
+            for item in items:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO tasks (key, item, updated_at) VALUES (?, ?, ?)",
+                    (self.key(item), json.dumps(item, ensure_ascii=False), now)
+                )
+                added += cursor.rowcount
+        return added
+
+    def lease(self, worker, limit=1):
+        now = time.time()
+        expires_at = now + self.visibility_timeout
+        leases = []
+        with self._transaction():
+            # A lease that keeps expiring means the item takes its worker down with it
+            self.conn.execute(
+                "UPDATE tasks SET status = 'dead', error = 'lease expired', lease_token = NULL, updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            rows = self.conn.execute(
+                "SELECT key, item, attempts FROM tasks "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) ORDER BY id LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            for key, item, attempts in rows:
+                token = uuid.uuid4().hex
+                self.conn.execute(
+                    "UPDATE tasks SET status = 'leased', lease_token = ?, lease_owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE key = ?",
+                    (token, worker, expires_at, now, key)
+                )
+                leases.append(Lease(key, json.loads(item), token, attempts + 1, expires_at))
+        return leases
+
+    def heartbeat(self, lease):
+        expires_at = time.time() + self.visibility_timeout
+        with self._transaction():
+            cursor = self.conn.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE key = ? AND lease_token = ? AND status = 'leased'",
+                (expires_at, lease.key, lease.token)
+            )
+        if cursor.rowcount:
+            lease.expires_at = expires_at
+        return cursor.rowcount > 0
+
+    def complete(self, lease, result=None):
+        # Accepted even from a worker whose lease expired: the work is done either way
+        with self._transaction():
+            cursor = self.conn.execute(
+                "UPDATE tasks SET status = 'done', result = ?, error = NULL, lease_token = NULL, updated_at = ? "
+                "WHERE key = ? AND status != 'done'",
+                (json.dumps(result, ensure_ascii=False) if result is not None else None, time.time(), lease.key)
+            )
+        return cursor.rowcount > 0
+
+    def fail(self, lease, error):
+        with self._transaction():
+            self.conn.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'dead' ELSE 'pending' END, "
+                "error = ?, lease_token = NULL, updated_at = ? WHERE key = ? AND lease_token = ?",
+                (self.max_attempts, str(error), time.time(), lease.key, lease.token)
+            )
+
+    def release(self, lease):
+        with self._transaction():
+            self.conn.execute(
+                "UPDATE tasks SET status = 'pending', attempts = MAX(attempts - 1, 0), lease_token = NULL, "
+                "updated_at = ? WHERE key = ? AND lease_token = ?",
+                (time.time(), lease.key, lease.token)
+            )
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+
+    def seal(self):
+        with self._transaction():
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('sealed', ?)", (str(time.time()),))
+
+    def unseal(self):
+        with self._transaction():
+            self.conn.execute("DELETE FROM meta WHERE key = 'sealed'")
+
+    def is_sealed(self):
+        return self.conn.execute("SELECT 1 FROM meta WHERE key = 'sealed'").fetchone() is not None
+
+    def results(self):
+        """
+        Yield the result of every done item, in queue order
+        """
+        for (result,) in self.conn.execute("SELECT result FROM tasks WHERE status = 'done' AND result IS NOT NULL ORDER BY id"):
+            yield json.loads(result)
+
+    def dead_items(self):
+        rows = self.conn.execute("SELECT item, error FROM tasks WHERE status = 'dead' ORDER BY id")
+        return [{**json.loads(item), 'error': error} for item, error in rows]
+
+    def requeue_dead(self):
+        """
+        Give every dead item a fresh set of attempts. Returns how many there were.
+        """
+        with self._transaction():
+            return self.conn.execute(
+                "UPDATE tasks SET status = 'pending', attempts = 0, updated_at = ? WHERE status = 'dead'", (time.time(),)
+            ).rowcount
+
+class _Immediate:
+    # BEGIN IMMEDIATE takes the write lock up front, so concurrent leases queue up instead of deadlocking
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, *exc):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+if __name__ == "__main__":
+    import argparse
+
+    from crawl_engine import load_schemes
+    from jsonl_writer import write_json_array
+    from structured_logging import configure_logging
+
+    parser = argparse.ArgumentParser(description="Shared work queue of scheme links for multi-process crawls")
+    parser.add_argument("queue", help="SQLite work queue file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue = commands.add_parser("enqueue", help="add schemes from a JSON list (title, link) and seal the queue")
+    enqueue.add_argument("schemes_file")
+    enqueue.add_argument("--more", action="store_true", help="leave the queue open, more schemes will follow")
+    commands.add_parser("seal", help="tell the workers nothing more will be enqueued")
+    commands.add_parser("status", help="count items per status")
+    export = commands.add_parser("export", help="write the records of every done item to a JSON file")
+    export.add_argument("dst")
+    commands.add_parser("requeue-dead", help="retry every dead item")
+    args = parser.parse_args()
+    configure_logging()
+
+    with SQLiteWorkQueue(args.queue) as queue:
+        if args.command == "enqueue":
+            added = queue.enqueue(load_schemes(args.schemes_file))
+            if not args.more:
+                queue.seal()
+            logger.info("Queued schemes", extra={"new": added, "sealed": queue.is_sealed()})
+        elif args.command == "seal":
+            queue.seal()
+        elif args.command == "export":
+            total = write_json_array(queue.results(), args.dst)
+            logger.info("Exported records", extra={"records": total, "path": args.dst})
+        elif args.command == "requeue-dead":
+            logger.info("Requeued dead schemes", extra={"schemes": queue.requeue_dead()})
+        logger.info("Work queue", extra={"counts": queue.counts(), "sealed": queue.is_sealed()})